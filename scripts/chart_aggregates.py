@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Chart Aggregates
+Every metric the charts use, computed once and cached on disk by input fingerprint
+"""
+
+import hashlib
+import pickle
+from collections import Counter
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from wolt_sketches import FixedHistogram
+
+# Bump when an aggregate's definition changes so stale cache entries are ignored
+AGGREGATES_VERSION = 5
+
+# Registry: aggregate name -> (input tables, function, persisted to disk)
+AGGREGATES = {}
+
+# Registry: aggregate name -> function computing it in SQL, used in place of
+# the AGGREGATES entry of the same name when the store has a database
+SQL_AGGREGATES = {}
+
+
+def aggregate(*tables, persist=True):
+    """
+    Register an aggregate computed from the named input tables.
+
+    The function receives the AggregateStore and reads its inputs through
+    store.table(name) or other aggregates through store.get(name). Any table
+    used, directly or via another aggregate, must be listed here so the cache
+    key changes when that table does. Row-level intermediates pass
+    persist=False to stay in memory only.
+    """
+    def register(func):
+        AGGREGATES[func.__name__] = (tables, func, persist)
+        return func
+    return register
+
+
+def sql_aggregate(name):
+    """
+    Register a SQL version of the named aggregate, computed with
+    store.database.query(sql, params) over a wolt_sqlite.WoltDatabase. It
+    must return a value of the same form as the pandas version, whose
+    registration supplies the input tables for the cache key.
+    """
+    def register(func):
+        SQL_AGGREGATES[name] = func
+        return func
+    return register
+
+
+def file_fingerprint(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _update_digest(digest, value):
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        # Pickles of pandas objects are not byte-stable, so hash their contents
+        if isinstance(value, pd.DataFrame):
+            header = (list(value.columns), [str(dtype) for dtype in value.dtypes])
+        else:
+            header = (value.name, str(value.dtype))
+        digest.update(repr((type(value).__name__, header)).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(value.tobytes())
+    elif isinstance(value, (tuple, list)):
+        digest.update(f"{type(value).__name__}{len(value)}".encode())
+        for element in value:
+            _update_digest(digest, element)
+    else:
+        digest.update(repr(value).encode())
+
+
+def value_fingerprint(value):
+    """Stable hash of an aggregate's value"""
+    digest = hashlib.sha256()
+    _update_digest(digest, value)
+    return digest.hexdigest()
+
+
+class MenuTotals:
+    """
+    Item counts of menu_items in total, by city and by restaurant_id.
+
+    Totals are built a chunk of rows at a time and partial totals merge by
+    adding counts, so memory grows with the number of cities and restaurants
+    rather than items. Totals of the whole table as a single chunk are the
+    in-memory path; any chunking gives exactly the same counts.
+    """
+
+    def __init__(self):
+        self.item_count = 0
+        self.by_city = Counter()
+        self.by_restaurant = Counter()
+
+    @staticmethod
+    def _counts(column):
+        # Categorical chunks may carry categories that none of their rows use
+        return {key: int(n) for key, n in column.value_counts().items() if n}
+
+    def add_chunk(self, chunk):
+        self.item_count += len(chunk)
+        self.by_city.update(self._counts(chunk['city']))
+        self.by_restaurant.update(self._counts(chunk['restaurant_id']))
+
+    def merge(self, other):
+        self.item_count += other.item_count
+        self.by_city.update(other.by_city)
+        self.by_restaurant.update(other.by_restaurant)
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        totals = cls()
+        for chunk in chunks:
+            totals.add_chunk(chunk)
+        return totals
+
+
+def _count_series(counts, index_name):
+    """Counts as an int64 Series ordered by key"""
+    series = pd.Series(dict(sorted(counts.items())), dtype='int64', name='count')
+    series.index.name = index_name
+    return series
+
+
+class AggregateStore:
+    """
+    Lazily computes aggregates, memoizing them in memory and on disk.
+
+    Each cached aggregate is keyed by its name and the fingerprints of its
+    input tables, so a refresh of menu_items leaves restaurant-only metrics
+    cached. Input tables are only loaded when some aggregate actually has to
+    be recomputed. With a database, aggregates that have a SQL version are
+    computed by the database instead.
+    """
+
+    def __init__(self, loaders, fingerprints, cache_dir=None, database=None):
+        self.loaders = loaders
+        self.fingerprints = fingerprints
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.database = database
+        self.tables = {}
+        self.values = {}
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def table(self, name):
+        if name not in self.tables:
+            print(f"Loading {name}...")
+            self.tables[name] = self.loaders[name]()
+        return self.tables[name]
+
+    def _cache_path(self, name):
+        tables = AGGREGATES[name][0]
+        key = '|'.join([str(AGGREGATES_VERSION), name] + [self.fingerprints[t] for t in tables])
+        return self.cache_dir / f"{name}-{hashlib.sha256(key.encode()).hexdigest()[:16]}.pkl"
+
+    def get(self, name):
+        if name in self.values:
+            return self.values[name]
+
+        _, func, persist = AGGREGATES[name]
+        if self.database is not None and name in SQL_AGGREGATES:
+            func = SQL_AGGREGATES[name]
+        path = self._cache_path(name) if self.cache_dir and persist else None
+        if path is not None and path.exists():
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        else:
+            value = func(self)
+            if path is not None:
+                with open(path, 'wb') as f:
+                    pickle.dump(value, f, protocol=4)
+
+        self.values[name] = value
+        return value
+
+
+# ============================================================================
+# RESTAURANT AGGREGATES
+# ============================================================================
+
+@aggregate('restaurants')
+def restaurant_count(store):
+    return len(store.table('restaurants'))
+
+
+@aggregate('restaurants')
+def city_count(store):
+    return store.table('restaurants')['city'].nunique()
+
+
+@aggregate('restaurants')
+def restaurants_by_city(store):
+    return store.table('restaurants')['city'].value_counts()
+
+
+@aggregate('restaurants')
+def average_rating(store):
+    return store.table('restaurants')['rating_score'].mean()
+
+
+@aggregate('restaurants')
+def total_reviews(store):
+    return store.table('restaurants')['rating_count'].sum()
+
+
+@aggregate('restaurants')
+def price_tier_counts(store):
+    counts = store.table('restaurants')['price_range'].value_counts().sort_index()
+    # Tiers are whole numbers even when the column is stored as float
+    counts.index = counts.index.astype(int)
+    return counts
+
+
+@aggregate('restaurants')
+def delivery_fee_split(store):
+    """(free, paid) restaurant counts"""
+    restaurants = store.table('restaurants')
+    return (int((restaurants['delivery_price_int'] == 0).sum()),
+            int((restaurants['delivery_price_int'] > 0).sum()))
+
+
+@aggregate('restaurants')
+def rating_category_counts(store):
+    restaurants = store.table('restaurants')
+    rated = restaurants[restaurants['rating_score'].notna()]
+    bins = [0, 7.0, 8.0, 9.0, 10.0]
+    labels = ['Needs Improvement\n(< 7.0)', 'Good\n(7.0-8.0)', 'Excellent\n(8.0-9.0)', 'Outstanding\n(9.0+)']
+    return pd.cut(rated['rating_score'], bins=bins, labels=labels, include_lowest=True).value_counts()
+
+
+@aggregate('restaurants')
+def top_rated_restaurants(store):
+    restaurants = store.table('restaurants')
+    rated = restaurants[restaurants['rating_score'].notna()]
+    return rated.nlargest(15, 'rating_score')[['name', 'rating_score', 'rating_count']]
+
+
+@aggregate('restaurants')
+def delivery_category_counts(store):
+    """(counts per delivery cost category, restaurants with a known delivery cost)"""
+    restaurants = store.table('restaurants')
+    delivery_rest = restaurants[restaurants['delivery_price_int'].notna() &
+                                (restaurants['delivery_price_int'] >= 0)]
+    categories = pd.cut(delivery_rest['delivery_price_int'] / 100,
+                        bins=[-0.1, 0.1, 2, 5, 100],
+                        labels=['Free Delivery', 'Low Cost\n(< ₼2)',
+                                'Moderate\n(₼2-5)', 'Premium\n(> ₼5)'])
+    return categories.value_counts(), len(delivery_rest)
+
+
+@aggregate('restaurants')
+def reviews_by_city(store):
+    restaurants = store.table('restaurants')
+    return restaurants.groupby('city', observed=True)['rating_count'].sum().sort_values(ascending=True)
+
+
+@aggregate('restaurants')
+def price_quality_points(store):
+    restaurants = store.table('restaurants')
+    positioned = restaurants[restaurants['rating_score'].notna() &
+                             restaurants['price_range'].notna() &
+                             (restaurants['rating_count'] > 10)]
+    return positioned[['price_range', 'rating_score', 'rating_count']].reset_index(drop=True)
+
+
+@aggregate('restaurants')
+def city_metrics(store):
+    city_metrics = store.table('restaurants').groupby('city', observed=True).agg({
+        'id': 'count',
+        'rating_score': 'mean'
+    }).reset_index()
+    city_metrics.columns = ['city', 'restaurant_count', 'avg_rating']
+    city_metrics = city_metrics.dropna()
+    return city_metrics.sort_values('avg_rating', ascending=True)
+
+
+# ============================================================================
+# MENU AGGREGATES
+# ============================================================================
+
+# Menu aggregates read MenuTotals, never the rows, so menu_items can be
+# streamed in chunks however large it is.
+
+@aggregate('menu_totals')
+def menu_item_count(store):
+    return store.table('menu_totals').item_count
+
+
+@aggregate('menu_totals')
+def menu_items_by_city(store):
+    """Menu items per city, most first; ties in city order"""
+    counts = _count_series(store.table('menu_totals').by_city, 'city')
+    return counts.sort_values(ascending=False, kind='stable')
+
+
+@aggregate('menu_totals')
+def menu_sizes(store):
+    """Menu items per restaurant_id"""
+    return _count_series(store.table('menu_totals').by_restaurant, 'restaurant_id')
+
+
+# Price aggregates read the wolt_sketches.PriceSketch of paid item prices in
+# AZN, never the rows: means are exact, the median is a KLL estimate.
+
+@aggregate('price_sketch')
+def average_price_by_city(store):
+    sketch = store.table('price_sketch')
+    means = pd.Series({city: stats.mean for city, stats in sketch.cities.items()}, dtype='float64', name='price_azn')
+    means.index.name = 'city'
+    return means.sort_values(ascending=True)
+
+
+@aggregate('price_sketch')
+def price_histogram(store):
+    """(counts, bin edges) of paid item prices in the sketch's fixed-width bins"""
+    histogram = store.table('price_sketch').total().histogram
+    return np.array(histogram.counts), np.array(histogram.edges)
+
+
+@aggregate('price_sketch')
+def price_summary(store):
+    """(median, mean) of paid item prices"""
+    total = store.table('price_sketch').total()
+    if not total.count:
+        return np.nan, np.nan
+    return total.quantiles.quantile(0.5), total.mean
+
+
+@aggregate('menu_totals', 'restaurants')
+def largest_menus(store):
+    """
+    The 15 restaurants with the most menu items, with their names. Taken from
+    the merged sizes: a restaurant's items may span chunks, so per-chunk
+    leaders do not merge into the overall ones.
+    """
+    menu_count = store.get('menu_sizes').reset_index(name='menu_size')
+    menu_with_info = menu_count.merge(store.table('restaurants')[['id', 'name']],
+                                      left_on='restaurant_id', right_on='id')
+    return menu_with_info.nlargest(15, 'menu_size')
+
+
+# ============================================================================
+# SQL AGGREGATES
+# ============================================================================
+
+# Menu aggregates over a WoltDatabase, grouped and counted by SQLite rather
+# than by scanning rows in pandas. Prices are exact here: the median is the
+# true median and the histogram uses the price sketch's bins.
+
+@sql_aggregate('menu_item_count')
+def sql_menu_item_count(store):
+    return store.database.query("SELECT COUNT(*) FROM menu_items")[0][0]
+
+
+@sql_aggregate('menu_items_by_city')
+def sql_menu_items_by_city(store):
+    rows = store.database.query("SELECT city, COUNT(*) FROM menu_items WHERE city IS NOT NULL GROUP BY city")
+    return _count_series(dict(rows), 'city').sort_values(ascending=False, kind='stable')
+
+
+@sql_aggregate('menu_sizes')
+def sql_menu_sizes(store):
+    rows = store.database.query(
+        "SELECT restaurant_id, COUNT(*) FROM menu_items WHERE restaurant_id IS NOT NULL GROUP BY restaurant_id")
+    return _count_series(dict(rows), 'restaurant_id')
+
+
+@sql_aggregate('average_price_by_city')
+def sql_average_price_by_city(store):
+    rows = store.database.query(
+        "SELECT city, AVG(item_price) / 100.0 FROM menu_items WHERE item_price > 0 GROUP BY city")
+    means = pd.Series(dict(rows), dtype='float64', name='price_azn')
+    means.index.name = 'city'
+    return means.sort_values(ascending=True)
+
+
+@sql_aggregate('price_histogram')
+def sql_price_histogram(store):
+    histogram = FixedHistogram()
+    rows = store.database.query(
+        "SELECT CAST((item_price / 100.0 - ?) / ? AS INTEGER) AS bin, COUNT(*) FROM menu_items "
+        "WHERE item_price > 0 GROUP BY bin", (histogram.start, histogram.width))
+    for index, count in rows:
+        if 0 <= index < len(histogram.counts):
+            histogram.counts[index] = count
+    return np.array(histogram.counts), np.array(histogram.edges)
+
+
+@sql_aggregate('price_summary')
+def sql_price_summary(store):
+    count, mean = store.database.query("SELECT COUNT(*), AVG(item_price) / 100.0 FROM menu_items "
+                                       "WHERE item_price > 0")[0]
+    if not count:
+        return np.nan, np.nan
+    # The middle price, or the mean of the two middle prices for an even count
+    middle = store.database.query(
+        "SELECT item_price FROM menu_items WHERE item_price > 0 ORDER BY item_price LIMIT ? OFFSET ?",
+        (2 - count % 2, (count - 1) // 2))
+    return sum(price for price, in middle) / len(middle) / 100, mean
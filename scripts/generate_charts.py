@@ -4,7 +4,15 @@ Wolt Azerbaijan Market Analysis - Chart Generation
 Generates business intelligence visualizations for executive decision-making
 """
 
-import pandas as pd
+import os
+import json
+import hashlib
+import inspect
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use('Agg')  # Render to files only, safe in worker processes
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
@@ -12,6 +20,12 @@ from pathlib import Path
 import warnings
 warnings.filterwarnings('ignore')
 
+from chart_aggregates import AggregateStore, MenuTotals, file_fingerprint, value_fingerprint
+from wolt_dataset import (load_restaurants, load_menu_items, load_table_sql, iter_table_chunks, table_path,
+                          DEFAULT_CHUNK_ROWS)
+from wolt_sketches import PriceSketch, PRICE_SKETCH_FILE
+from wolt_sqlite import WoltDatabase
+
 # Set professional style
 sns.set_style("whitegrid")
 plt.rcParams['figure.figsize'] = (12, 6)
@@ -23,32 +37,106 @@ plt.rcParams['axes.labelsize'] = 11
 CHARTS_DIR = Path("charts")
 CHARTS_DIR.mkdir(exist_ok=True)
 
-# Load data
-print("Loading data...")
-restaurants = pd.read_csv("data/restaurants.csv")
-menu_items = pd.read_csv("data/menu_items.csv")
+# Input directory
+DATA_DIR = Path("data")
+
+# Aggregate cache and chart manifest for incremental rebuilds
+CACHE_DIR = Path(".chart_cache")
+MANIFEST_FILE = CACHE_DIR / "charts.json"
+
+# Columns the chart aggregates read from each table
+CHART_COLUMNS = {
+    'restaurants': ['id', 'name', 'city', 'price_range', 'delivery_price_int', 'rating_score', 'rating_count'],
+    'menu_items': ['restaurant_id', 'city'],
+}
+
+
+def price_sketch_path():
+    """
+    The scraper's price sketch, or None when it is missing or older than
+    menu_items.csv. The sketch is saved with the CSV; a Parquet copy converted
+    from it afterwards is newer but holds the same rows.
+    """
+    path = DATA_DIR / PRICE_SKETCH_FILE
+    menu_path = DATA_DIR / "menu_items.csv"
+    if not menu_path.exists():
+        menu_path = table_path('menu_items', DATA_DIR)
+    if not path.exists() or path.stat().st_mtime < menu_path.stat().st_mtime:
+        return None
+    return path
+
+
+def load_price_sketch(chunk_rows=DEFAULT_CHUNK_ROWS):
+    """The scraper's price sketch, or one built from menu_items a chunk at a time"""
+    path = price_sketch_path()
+    if path is not None:
+        return PriceSketch.load(path)
+    sketch = PriceSketch()
+    for chunk in iter_table_chunks('menu_items', ['city', 'item_price'], chunk_rows=chunk_rows, data_dir=DATA_DIR):
+        sketch.add_prices(chunk['city'], chunk['item_price'])
+    return sketch
+
+
+def load_menu_totals(chunk_rows=None):
+    """Menu item counts, from menu_items loaded whole or, given chunk_rows, streamed in chunks"""
+    columns = CHART_COLUMNS['menu_items']
+    if chunk_rows:
+        chunks = iter_table_chunks('menu_items', columns, chunk_rows=chunk_rows, data_dir=DATA_DIR)
+    else:
+        chunks = [load_menu_items(columns, data_dir=DATA_DIR)]
+    return MenuTotals.from_chunks(chunks)
+
+
+def open_database_store(path, cache=True):
+    """
+    Aggregate store over a wolt_sqlite database: menu aggregates run as SQL,
+    restaurants are read from the venues table. Cache entries are keyed by
+    the database's table versions.
+    """
+    database = WoltDatabase(path, readonly=True)
+    loaders = {
+        'restaurants': lambda: load_table_sql(database, 'restaurants', CHART_COLUMNS['restaurants']),
+    }
+    menu_fingerprint = f"sqlite:{database.version('menu_items')}"
+    fingerprints = {
+        'restaurants': f"sqlite:{database.version('venues')}",
+        'menu_totals': menu_fingerprint,
+        'price_sketch': menu_fingerprint,
+    }
+    return AggregateStore(loaders, fingerprints, cache_dir=CACHE_DIR / "aggregates" if cache else None,
+                          database=database)
 
-print(f"Loaded {len(restaurants)} restaurants and {len(menu_items)} menu items")
 
-# Data preparation
-restaurants['rating_score'] = pd.to_numeric(restaurants['rating_score'], errors='coerce')
-restaurants['rating_count'] = pd.to_numeric(restaurants['rating_count'], errors='coerce')
-restaurants['price_range'] = pd.to_numeric(restaurants['price_range'], errors='coerce')
-restaurants['delivery_price_int'] = pd.to_numeric(restaurants['delivery_price_int'], errors='coerce')
-menu_items['item_price'] = pd.to_numeric(menu_items['item_price'], errors='coerce')
+def open_aggregate_store(cache=True, chunk_rows=None):
+    """Aggregate store over the current input files; chunk_rows bounds how much of menu_items is in memory"""
+    loaders = {
+        'restaurants': lambda: load_restaurants(CHART_COLUMNS['restaurants'], data_dir=DATA_DIR),
+        'menu_totals': lambda: load_menu_totals(chunk_rows),
+        'price_sketch': lambda: load_price_sketch(chunk_rows or DEFAULT_CHUNK_ROWS),
+    }
+    # Both menu_items paths give identical totals, so they share cache entries
+    menu_fingerprint = file_fingerprint(table_path('menu_items', DATA_DIR))
+    fingerprints = {
+        'restaurants': file_fingerprint(table_path('restaurants', DATA_DIR)),
+        'menu_totals': menu_fingerprint,
+    }
+    sketch_path = price_sketch_path()
+    fingerprints['price_sketch'] = (file_fingerprint(sketch_path) if sketch_path is not None
+                                    else f"derived:{menu_fingerprint}")
+    return AggregateStore(loaders, fingerprints, cache_dir=CACHE_DIR / "aggregates" if cache else None)
 
 
 # ============================================================================
 # 1. MARKET PRESENCE ANALYSIS
 # ============================================================================
 
-def generate_market_presence_charts():
+def generate_market_presence_charts(agg):
     """Generate charts showing market presence across cities"""
     print("\n1. Generating market presence analysis...")
 
     # Chart 1.1: Restaurant count by city
     fig, ax = plt.subplots(figsize=(12, 6))
-    city_counts = restaurants['city'].value_counts().sort_values(ascending=True)
+    city_counts = agg['restaurants_by_city'].sort_values(ascending=True)
     city_counts.plot(kind='barh', ax=ax, color='#2E86AB')
     ax.set_xlabel('Number of Restaurants')
     ax.set_ylabel('City')
@@ -65,7 +153,7 @@ def generate_market_presence_charts():
 
     # Chart 1.2: Menu items per city
     fig, ax = plt.subplots(figsize=(12, 6))
-    city_menu_counts = menu_items['city'].value_counts().sort_values(ascending=True)
+    city_menu_counts = agg['menu_items_by_city'].sort_values(ascending=True)
     city_menu_counts.plot(kind='barh', ax=ax, color='#A23B72')
     ax.set_xlabel('Total Menu Items')
     ax.set_ylabel('City')
@@ -84,13 +172,13 @@ def generate_market_presence_charts():
 # 2. PRICING STRATEGY ANALYSIS
 # ============================================================================
 
-def generate_pricing_charts():
+def generate_pricing_charts(agg):
     """Generate charts analyzing pricing strategies"""
     print("\n2. Generating pricing analysis...")
 
     # Chart 2.1: Price range distribution
     fig, ax = plt.subplots(figsize=(10, 6))
-    price_dist = restaurants['price_range'].value_counts().sort_index()
+    price_dist = agg['price_tier_counts'].copy()
     price_labels = {1: 'Budget\n(₼)', 2: 'Moderate\n(₼₼)', 3: 'Premium\n(₼₼₼)', 4: 'Luxury\n(₼₼₼₼)'}
     price_dist.index = price_dist.index.map(lambda x: price_labels.get(x, f'Level {x}'))
 
@@ -111,13 +199,8 @@ def generate_pricing_charts():
     plt.close()
 
     # Chart 2.2: Average menu item price by city
-    menu_with_city = menu_items[menu_items['item_price'] > 0].copy()
-
-    # Convert to AZN (assuming ALL is Albanian Lek, rough conversion for comparison)
-    menu_with_city['price_azn'] = menu_with_city['item_price'] / 100
-
     fig, ax = plt.subplots(figsize=(12, 6))
-    avg_price_by_city = menu_with_city.groupby('city')['price_azn'].mean().sort_values(ascending=True)
+    avg_price_by_city = agg['average_price_by_city']
     avg_price_by_city.plot(kind='barh', ax=ax, color='#F18F01')
     ax.set_xlabel('Average Menu Item Price (AZN)')
     ax.set_ylabel('City')
@@ -136,21 +219,13 @@ def generate_pricing_charts():
 # 3. CUSTOMER SATISFACTION ANALYSIS
 # ============================================================================
 
-def generate_satisfaction_charts():
+def generate_satisfaction_charts(agg):
     """Generate charts analyzing customer satisfaction"""
     print("\n3. Generating customer satisfaction analysis...")
 
     # Chart 3.1: Rating distribution
     fig, ax = plt.subplots(figsize=(10, 6))
-    restaurants_with_ratings = restaurants[restaurants['rating_score'].notna()]
-
-    # Create rating bins
-    bins = [0, 7.0, 8.0, 9.0, 10.0]
-    labels = ['Needs Improvement\n(< 7.0)', 'Good\n(7.0-8.0)', 'Excellent\n(8.0-9.0)', 'Outstanding\n(9.0+)']
-    restaurants_with_ratings['rating_category'] = pd.cut(restaurants_with_ratings['rating_score'],
-                                                          bins=bins, labels=labels, include_lowest=True)
-
-    rating_dist = restaurants_with_ratings['rating_category'].value_counts()
+    rating_dist = agg['rating_category_counts']
     colors = ['#EF476F', '#FFD166', '#06D6A0', '#118AB2']
 
     ax.bar(range(len(rating_dist)), rating_dist.values,
@@ -170,7 +245,7 @@ def generate_satisfaction_charts():
 
     # Chart 3.2: Top 15 highest-rated restaurants
     fig, ax = plt.subplots(figsize=(12, 8))
-    top_rated = restaurants_with_ratings.nlargest(15, 'rating_score')[['name', 'rating_score', 'rating_count']]
+    top_rated = agg['top_rated_restaurants']
 
     ax.barh(range(len(top_rated)), top_rated['rating_score'].values, color='#06D6A0')
     ax.set_yticks(range(len(top_rated)))
@@ -195,23 +270,14 @@ def generate_satisfaction_charts():
 # 4. OPERATIONAL EFFICIENCY
 # ============================================================================
 
-def generate_operations_charts():
+def generate_operations_charts(agg):
     """Generate charts analyzing operational efficiency"""
     print("\n4. Generating operational efficiency analysis...")
 
     # Chart 4.1: Delivery cost distribution
-    delivery_rest = restaurants[restaurants['delivery_price_int'].notna() &
-                                 (restaurants['delivery_price_int'] >= 0)]
+    delivery_dist, delivery_total = agg['delivery_category_counts']
 
     fig, ax = plt.subplots(figsize=(10, 6))
-
-    # Group by delivery cost
-    delivery_rest['delivery_category'] = pd.cut(delivery_rest['delivery_price_int'] / 100,
-                                                  bins=[-0.1, 0.1, 2, 5, 100],
-                                                  labels=['Free Delivery', 'Low Cost\n(< ₼2)',
-                                                          'Moderate\n(₼2-5)', 'Premium\n(> ₼5)'])
-
-    delivery_dist = delivery_rest['delivery_category'].value_counts()
     colors = ['#06D6A0', '#118AB2', '#FFD166', '#EF476F']
 
     ax.bar(range(len(delivery_dist)), delivery_dist.values,
@@ -223,7 +289,7 @@ def generate_operations_charts():
     ax.grid(axis='y', alpha=0.3)
 
     for i, v in enumerate(delivery_dist.values):
-        pct = (v / len(delivery_rest)) * 100
+        pct = (v / delivery_total) * 100
         ax.text(i, v + 5, f'{v}\n({pct:.1f}%)', ha='center', fontweight='bold')
 
     plt.tight_layout()
@@ -231,12 +297,8 @@ def generate_operations_charts():
     plt.close()
 
     # Chart 4.2: Menu size analysis
-    menu_count = menu_items.groupby('restaurant_id').size().reset_index(name='menu_size')
-    menu_with_info = menu_count.merge(restaurants[['id', 'name']],
-                                       left_on='restaurant_id', right_on='id')
-
     fig, ax = plt.subplots(figsize=(12, 8))
-    top_menu_size = menu_with_info.nlargest(15, 'menu_size')
+    top_menu_size = agg['largest_menus']
 
     ax.barh(range(len(top_menu_size)), top_menu_size['menu_size'].values, color='#A23B72')
     ax.set_yticks(range(len(top_menu_size)))
@@ -257,7 +319,7 @@ def generate_operations_charts():
 # 5. COMPETITIVE LANDSCAPE
 # ============================================================================
 
-def generate_competitive_charts():
+def generate_competitive_charts(agg):
     """Generate charts analyzing competitive dynamics"""
     print("\n5. Generating competitive landscape analysis...")
 
@@ -265,7 +327,7 @@ def generate_competitive_charts():
     fig, ax = plt.subplots(figsize=(12, 6))
 
     # Get review volume by city
-    city_reviews = restaurants.groupby('city')['rating_count'].sum().sort_values(ascending=True)
+    city_reviews = agg['reviews_by_city']
 
     ax.barh(range(len(city_reviews)), city_reviews.values, color='#073B4C')
     ax.set_yticks(range(len(city_reviews)))
@@ -285,9 +347,7 @@ def generate_competitive_charts():
     fig, ax = plt.subplots(figsize=(12, 8))
 
     # Filter restaurants with both ratings and price range
-    positioned_rest = restaurants[restaurants['rating_score'].notna() &
-                                   restaurants['price_range'].notna() &
-                                   (restaurants['rating_count'] > 10)]
+    positioned_rest = agg['price_quality_points']
 
     # Create scatter plot
     scatter = ax.scatter(positioned_rest['price_range'],
@@ -333,20 +393,14 @@ def generate_competitive_charts():
 # 6. GROWTH OPPORTUNITIES
 # ============================================================================
 
-def generate_opportunity_charts():
+def generate_opportunity_charts(agg):
     """Generate charts identifying growth opportunities"""
     print("\n6. Generating opportunity analysis...")
 
     # Chart 6.1: Cities with high ratings but fewer restaurants
     fig, ax = plt.subplots(figsize=(12, 6))
 
-    city_metrics = restaurants.groupby('city').agg({
-        'id': 'count',
-        'rating_score': 'mean'
-    }).reset_index()
-    city_metrics.columns = ['city', 'restaurant_count', 'avg_rating']
-    city_metrics = city_metrics.dropna()
-    city_metrics = city_metrics.sort_values('avg_rating', ascending=True)
+    city_metrics = agg['city_metrics']
 
     # Create horizontal bar chart with two axes
     x = np.arange(len(city_metrics))
@@ -375,10 +429,11 @@ def generate_opportunity_charts():
     # Chart 6.2: Menu item price distribution
     fig, ax = plt.subplots(figsize=(12, 6))
 
-    menu_prices = menu_items[menu_items['item_price'] > 0]['item_price'] / 100
+    counts, edges = agg['price_histogram']
 
-    # Create histogram
-    n, bins, patches = ax.hist(menu_prices, bins=50, color='#F18F01', edgecolor='black', alpha=0.7)
+    # Create histogram from the precomputed bin counts
+    n, bins, patches = ax.hist(edges[:-1], bins=edges, weights=counts,
+                               color='#F18F01', edgecolor='black', alpha=0.7)
 
     # Color bars based on price ranges
     for i, patch in enumerate(patches):
@@ -398,8 +453,7 @@ def generate_opportunity_charts():
     ax.set_xlim(0, 20)
 
     # Add median and mean lines
-    median_price = menu_prices.median()
-    mean_price = menu_prices.mean()
+    median_price, mean_price = agg['price_summary']
     ax.axvline(median_price, color='red', linestyle='--', linewidth=2,
                label=f'Median: ₼{median_price:.2f}')
     ax.axvline(mean_price, color='darkred', linestyle=':', linewidth=2,
@@ -415,7 +469,7 @@ def generate_opportunity_charts():
 # 7. KEY METRICS SUMMARY
 # ============================================================================
 
-def generate_summary_chart():
+def generate_summary_chart(agg):
     """Generate executive summary dashboard"""
     print("\n7. Generating executive summary...")
 
@@ -426,9 +480,9 @@ def generate_summary_chart():
     # Metric 1: Total market size
     ax = axes[0, 0]
     metrics = {
-        'Restaurants': len(restaurants),
-        'Menu Items': len(menu_items),
-        'Cities': restaurants['city'].nunique()
+        'Restaurants': agg['restaurant_count'],
+        'Menu Items': agg['menu_item_count'],
+        'Cities': agg['city_count']
     }
     colors_m = ['#2E86AB', '#A23B72', '#F18F01']
     bars = ax.bar(metrics.keys(), metrics.values(), color=colors_m)
@@ -442,8 +496,8 @@ def generate_summary_chart():
 
     # Metric 2: Average ratings
     ax = axes[0, 1]
-    avg_rating = restaurants['rating_score'].mean()
-    total_reviews = restaurants['rating_count'].sum()
+    avg_rating = agg['average_rating']
+    total_reviews = agg['total_reviews']
 
     ax.bar(['Avg Rating'], [avg_rating], color='#06D6A0', width=0.5)
     ax.set_ylim(0, 10)
@@ -455,8 +509,8 @@ def generate_summary_chart():
 
     # Metric 3: Price distribution
     ax = axes[0, 2]
-    price_counts = restaurants['price_range'].value_counts().sort_index()
-    price_pcts = (price_counts / len(restaurants) * 100)
+    price_counts = agg['price_tier_counts']
+    price_pcts = (price_counts / agg['restaurant_count'] * 100)
 
     colors_p = ['#06D6A0', '#118AB2', '#073B4C', '#EF476F']
     bars = ax.bar([f'₼'*int(i) for i in price_counts.index],
@@ -471,7 +525,7 @@ def generate_summary_chart():
 
     # Metric 4: Top cities by restaurants
     ax = axes[1, 0]
-    top_cities = restaurants['city'].value_counts().head(5)
+    top_cities = agg['restaurants_by_city'].head(5)
     ax.barh(range(len(top_cities)), top_cities.values, color='#2E86AB')
     ax.set_yticks(range(len(top_cities)))
     ax.set_yticklabels(top_cities.index)
@@ -483,8 +537,7 @@ def generate_summary_chart():
 
     # Metric 5: Delivery cost
     ax = axes[1, 1]
-    free_delivery = len(restaurants[restaurants['delivery_price_int'] == 0])
-    paid_delivery = len(restaurants[restaurants['delivery_price_int'] > 0])
+    free_delivery, paid_delivery = agg['delivery_fee_split']
 
     delivery_data = [free_delivery, paid_delivery]
     delivery_labels = ['Free\nDelivery', 'Paid\nDelivery']
@@ -496,13 +549,13 @@ def generate_summary_chart():
     ax.grid(axis='y', alpha=0.3)
     for bar, value in zip(bars, delivery_data):
         height = bar.get_height()
-        pct = (value / len(restaurants)) * 100
+        pct = (value / agg['restaurant_count']) * 100
         ax.text(bar.get_x() + bar.get_width()/2., height,
                 f'{value}\n({pct:.1f}%)', ha='center', va='bottom', fontweight='bold')
 
     # Metric 6: Menu size average
     ax = axes[1, 2]
-    menu_sizes = menu_items.groupby('restaurant_id').size()
+    menu_sizes = agg['menu_sizes']
     avg_menu_size = menu_sizes.mean()
     median_menu_size = menu_sizes.median()
     max_menu_size = menu_sizes.max()
@@ -529,19 +582,131 @@ def generate_summary_chart():
 # MAIN EXECUTION
 # ============================================================================
 
+# Chart job -> (aggregates it reads, files it writes)
+CHART_JOBS = {
+    generate_summary_chart: (
+        ['restaurant_count', 'menu_item_count', 'city_count', 'average_rating', 'total_reviews',
+         'price_tier_counts', 'restaurants_by_city', 'delivery_fee_split', 'menu_sizes'],
+        ['00_executive_dashboard.png']),
+    generate_market_presence_charts: (
+        ['restaurants_by_city', 'menu_items_by_city'],
+        ['01_restaurant_distribution_by_city.png', '02_menu_items_by_city.png']),
+    generate_pricing_charts: (
+        ['price_tier_counts', 'average_price_by_city'],
+        ['03_price_tier_distribution.png', '04_average_price_by_city.png']),
+    generate_satisfaction_charts: (
+        ['rating_category_counts', 'top_rated_restaurants'],
+        ['05_satisfaction_distribution.png', '06_top_rated_restaurants.png']),
+    generate_operations_charts: (
+        ['delivery_category_counts', 'largest_menus'],
+        ['07_delivery_cost_distribution.png', '08_menu_complexity.png']),
+    generate_competitive_charts: (
+        ['reviews_by_city', 'price_quality_points'],
+        ['09_market_engagement_by_city.png', '10_price_quality_positioning.png']),
+    generate_opportunity_charts: (
+        ['city_metrics', 'price_histogram', 'price_summary'],
+        ['11_opportunity_matrix.png', '12_price_distribution.png']),
+}
+
+
+def job_key(job, agg):
+    """Fingerprint of a chart job's code and the aggregate values it draws"""
+    digest = hashlib.sha256(inspect.getsource(job).encode('utf-8'))
+    for name in CHART_JOBS[job][0]:
+        digest.update(value_fingerprint(agg[name]).encode())
+    return digest.hexdigest()
+
+
+def load_manifest():
+    if MANIFEST_FILE.exists():
+        return json.loads(MANIFEST_FILE.read_text())
+    return {}
+
+
+def save_manifest(manifest):
+    CACHE_DIR.mkdir(exist_ok=True)
+    MANIFEST_FILE.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+
+
+def plan_jobs(store, force=False):
+    """
+    Work out which chart jobs need redrawing.
+
+    A job is skipped when its code and every aggregate it reads are unchanged
+    since the last run and its files still exist. Returns (jobs with their
+    aggregate values, updated manifest).
+    """
+    manifest = load_manifest()
+    planned = []
+    for job, (names, outputs) in CHART_JOBS.items():
+        agg = {name: store.get(name) for name in names}
+        key = job_key(job, agg)
+        outputs_exist = all((CHARTS_DIR / output).exists() for output in outputs)
+        if not force and manifest.get(job.__name__) == key and outputs_exist:
+            print(f"Skipping {job.__name__}: inputs unchanged")
+            continue
+        planned.append((job, agg))
+        manifest[job.__name__] = key
+    return planned, manifest
+
+
+def render_charts_parallel(planned, jobs):
+    """
+    Render chart groups across a process pool.
+
+    Jobs receive only the precomputed aggregates they draw, which are small,
+    so no DataFrame is pickled to a worker. Workers are forked where the
+    platform allows it to skip re-importing matplotlib.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(planned)), mp_context=context) as pool:
+        futures = [pool.submit(job, agg) for job, agg in planned]
+        for future in futures:
+            future.result()
+
+
+def parse_args(argv=None):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description="Generate the market analysis charts")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="Worker processes for rendering; 0 uses every core (default: 1)")
+    parser.add_argument('--force', action='store_true',
+                        help="Redraw every chart even if its inputs are unchanged")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Recompute aggregates instead of reading them from the on-disk cache")
+    parser.add_argument('--chunk-rows', type=int, default=None,
+                        help="Stream menu_items this many rows at a time instead of loading it whole; "
+                             "the charts are identical either way")
+    parser.add_argument('--sqlite', default=None, metavar='PATH',
+                        help="Compute the aggregates with SQL over this database (from scrape_wolt_restaurants.py "
+                             "--sqlite) instead of reading the CSV files")
+    return parser.parse_args(argv)
+
+
 def main():
     """Generate all charts"""
+    args = parse_args()
+    jobs = args.jobs or os.cpu_count() or 1
+
     print("="*70)
     print("WOLT AZERBAIJAN MARKET ANALYSIS - CHART GENERATION")
     print("="*70)
 
-    generate_summary_chart()
-    generate_market_presence_charts()
-    generate_pricing_charts()
-    generate_satisfaction_charts()
-    generate_operations_charts()
-    generate_competitive_charts()
-    generate_opportunity_charts()
+    if args.sqlite:
+        store = open_database_store(args.sqlite, cache=not args.no_cache)
+    else:
+        store = open_aggregate_store(cache=not args.no_cache, chunk_rows=args.chunk_rows)
+    planned, manifest = plan_jobs(store, force=args.force)
+
+    if planned and jobs > 1:
+        print(f"\nRendering {len(planned)} chart groups with {jobs} worker processes...")
+        render_charts_parallel(planned, jobs)
+    else:
+        for job, agg in planned:
+            job(agg)
+    save_manifest(manifest)
 
     print("\n" + "="*70)
     print("ALL CHARTS GENERATED SUCCESSFULLY!")
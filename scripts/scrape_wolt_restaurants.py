@@ -7,11 +7,37 @@ Scrapes all Wolt restaurants and their menus from available cities and saves to
 import json
 import csv
 import time
-import requests
+import asyncio
+import threading
+import argparse
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import urlparse
 import logging
 
+from wolt_output import (MemorySink, StreamingCsvSink, RESTAURANT_FIELDS, MENU_ITEM_FIELDS, COMBINED_FIELDS,
+                         group_by_restaurant, iter_combined_rows, merge_into_csv)
+from wolt_parquet import export_parquet
+from wolt_sqlite import WoltDatabase, DEFAULT_DATABASE
+from wolt_json import iter_venues, assortment_layout, slim_items
+from wolt_records import MenuOwner, MenuItem, menu_rows, menu_from_rows
+from wolt_menus import SharedMenus
+from wolt_snapshot import SnapshotStore, venue_fingerprint, SNAPSHOT_FILE, DEFAULT_MAX_AGE_DAYS
+from wolt_metrics import Metrics, DEFAULT_EXPORT_INTERVAL
+from wolt_sweep import (VenueIndex, ring_tiles, DEFAULT_TILE_SPACING_KM, DEFAULT_MAX_RINGS,
+                        DEFAULT_MIN_NEW_VENUES)
+from wolt_checkpoint import CheckpointStore, CHECKPOINT_FILE
+from wolt_cache import ResponseCache, DEFAULT_CACHE_SIZE_MB
+from wolt_ratelimit import RateLimiter, VENUES, ASSORTMENT, ASSORTMENT_ITEMS, DEFAULT_RATE, MAX_RATE
+from wolt_transport import WoltTransport, ArchiveTransport, DEFAULT_TIMEOUT
+from wolt_archive import ResponseArchive
+from wolt_sketches import PriceSketch, PRICE_SKETCH_FILE
+from wolt_retry import RetryQueue, RetryTask, DeadLetterFile, error_class, DEAD_LETTER_FILE
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -39,8 +65,19 @@ HEADERS = {
     'w-wolt-session-id': 'no-analytics-consent'
 }
 
-# Rate limiting
-DELAY_BETWEEN_REQUESTS = 1  # seconds
+# Scraping engines
+ENGINES = ('sequential', 'async')
+DEFAULT_CONCURRENCY = 8  # in-flight requests per host for the async engine
+
+# Item detail batching for large menus
+ITEM_BATCH_SIZE = 250  # item_ids per assortment/items request
+ITEM_BATCH_WORKERS = 4  # concurrent batch requests across the scraper
+ITEM_BATCH_RETRIES = 2  # in-place retries of one failed batch, with the retry queue's backoff
+REPLAY_CHUNK = 200  # restaurants per task when replaying menus on a process pool
+
+# Endpoint each kind of queued fetch starts with, so queue retries share the
+# transport's wolt_retries_total labels (layer, outcome, endpoint, error_class)
+RETRY_ENDPOINTS = {'city': VENUES, 'menu': ASSORTMENT}
 
 
 def safe_join(items, separator=', '):
@@ -53,14 +90,101 @@ def safe_join(items, separator=', '):
         return str(items)
 
 
+def menu_item(owner: MenuOwner, item: Dict) -> MenuItem:
+    """Build a menu item record from a slim item details dict"""
+    return MenuItem(owner, item.get('id'), item.get('name'), item.get('description', ''),
+                    item.get('price'), safe_join(item.get('tags', [])), bool(item.get('options')),
+                    item.get('vat_percentage'))
+
+
 class WoltScraper:
-    def __init__(self, cities_file: str = "examples/cities.json", max_cities: int = None, country_filter: str = None):
+    def __init__(self, cities_file: str = "examples/cities.json", max_cities: int = None, country_filter: str = None,
+                 engine: str = 'sequential', concurrency: int = DEFAULT_CONCURRENCY,
+                 rate: float = DEFAULT_RATE, max_rate: float = MAX_RATE,
+                 cache_dir: str = None, cache_size_mb: float = DEFAULT_CACHE_SIZE_MB,
+                 checkpoint_path: str = None, resume: bool = False,
+                 stream: bool = False, output_dir: str = "data",
+                 item_batch_size: int = ITEM_BATCH_SIZE, item_batch_workers: int = ITEM_BATCH_WORKERS,
+                 sweep: bool = False, sweep_spacing_km: float = DEFAULT_TILE_SPACING_KM,
+                 sweep_max_rings: int = DEFAULT_MAX_RINGS, sweep_min_new: int = DEFAULT_MIN_NEW_VENUES,
+                 metrics_file: str = None, prometheus_file: str = None,
+                 prometheus_interval: float = DEFAULT_EXPORT_INTERVAL, base_url: str = BASE_URL,
+                 archive_dir: str = None, replay: bool = False, replay_as_of: float = None, replay_workers: int = 1,
+                 share_menus: bool = True, snapshot_path: str = None, delta: bool = False,
+                 delta_max_age_days: float = DEFAULT_MAX_AGE_DAYS, dead_letter_path: str = None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+        if item_batch_size < 1:
+            raise ValueError(f"item_batch_size must be at least 1, got {item_batch_size}")
+        if replay and not archive_dir:
+            raise ValueError("replay needs an archive_dir to replay from")
         self.cities_file = cities_file
+        self.base_url = base_url
+        # Endpoints are derived from base_url so a local mock server can stand in for the API
+        self.restaurants_api = RESTAURANTS_API.replace(BASE_URL, base_url.rstrip('/'), 1)
+        self.items_api = ITEMS_API.replace(BASE_URL, base_url.rstrip('/'), 1)
         self.max_cities = max_cities
         self.country_filter = country_filter
+        self.engine = engine
+        self.concurrency = concurrency
+        self.stream = stream
+        self.output_dir = output_dir
+        self.item_batch_size = item_batch_size
+        self.sweep = sweep
+        self.sweep_spacing_km = sweep_spacing_km
+        self.sweep_max_rings = sweep_max_rings
+        self.sweep_min_new = sweep_min_new
+        self.archive_dir = archive_dir
+        self.replay = replay
+        self.replay_as_of = replay_as_of
+        self.replay_workers = replay_workers
+        self.metrics_file = metrics_file
+        self.prometheus_file = prometheus_file
+        self.metrics = Metrics()
+        if prometheus_file:
+            self.metrics.start_export(prometheus_file, prometheus_interval)
+        self.item_batch_executor = ThreadPoolExecutor(max_workers=item_batch_workers)
+        # Batches that succeeded for menus whose other batches failed, by venue slug, until the menu is retried
+        self.kept_batches: Dict[str, Dict[Tuple[str, ...], List[Dict]]] = {}
+        self.kept_batches_lock = threading.Lock()
+        # Chain branches with identical assortments reuse one fetch of their item details
+        self.shared_menus = SharedMenus() if share_menus else None
+        self.rate_limiter = RateLimiter(rate=rate, max_rate=max_rate)
+        self.cache = ResponseCache(cache_dir, max_size_mb=cache_size_mb) if cache_dir else None
+        # Sized for engine workers plus item batch workers (or sweep probes, at most `concurrency` more)
+        pool_size = concurrency * (2 if sweep else 1) + item_batch_workers
+        if replay:
+            # Every response comes from the archive; nothing touches the network
+            self.transport = ArchiveTransport(ResponseArchive(archive_dir, readonly=True),
+                                              as_of=replay_as_of, metrics=self.metrics)
+        else:
+            archive = ResponseArchive(archive_dir) if archive_dir else None
+            # Retries are left to the retry queue and item batches; the transport just reports throttling
+            self.transport = WoltTransport(HEADERS, pool_size=pool_size, timeout=DEFAULT_TIMEOUT,
+                                           rate_limiter=self.rate_limiter, cache=self.cache, metrics=self.metrics,
+                                           archive=archive, throttle_retries=0)
+        if resume and not checkpoint_path:
+            checkpoint_path = f"{output_dir}/{CHECKPOINT_FILE}"
+        self.checkpoint = CheckpointStore(checkpoint_path, resume=resume) if checkpoint_path else None
+        # Failed fetches are retried after the main pass; those that keep failing are dead-lettered
+        self.retry_queue = RetryQueue()
+        self.dead_letter = DeadLetterFile(dead_letter_path or f"{output_dir}/{DEAD_LETTER_FILE}")
+        self.price_sketch = PriceSketch()
+        # Every menu is recorded in the snapshot; in delta mode it also decides what is fetched
+        if delta and not snapshot_path:
+            snapshot_path = f"{output_dir}/{SNAPSHOT_FILE}"
+        self.snapshot = SnapshotStore(snapshot_path) if snapshot_path else None
+        self.delta = delta
+        self.delta_max_age = delta_max_age_days * 86400
+        if delta:
+            logger.info(f"Delta mode: {len(self.snapshot)} venue menus in {snapshot_path}")
         self.cities = []
         self.restaurants = []
         self.menu_items = []
+        self.restaurant_count = 0
+        self.menu_item_count = 0
 
     def load_cities(self) -> List[Dict]:
         """Load cities from JSON file"""
@@ -72,7 +196,7 @@ class WoltScraper:
             return cities
 
     def fetch_restaurants_for_city(self, city: Dict) -> List[Dict]:
-        """Fetch all restaurants for a given city"""
+        """Fetch all restaurants for a given city; fetch errors are raised for the retry queue"""
         city_name = city.get('name', city.get('slug', 'unknown'))
         coordinates = city.get('location', {}).get('coordinates', [])
 
@@ -82,35 +206,65 @@ class WoltScraper:
 
         lon, lat = coordinates[0], coordinates[1]
 
+        if self.sweep:
+            return self.sweep_restaurants_for_city(city, lat, lon)
+
         logger.info(f"Fetching restaurants for {city_name} (lat={lat}, lon={lon})")
 
-        try:
-            params = {'lat': lat, 'lon': lon}
-            response = requests.get(RESTAURANTS_API, params=params, headers=HEADERS, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-
-            # Extract venues from sections
-            venues = []
-            for section in data.get('sections', []):
-                for item in section.get('items', []):
-                    if item.get('template') == 'venue-large' and 'venue' in item:
-                        venue = item['venue'].copy()
-                        venue['city'] = city_name
-                        venue['city_slug'] = city.get('slug', '')
-                        venue['city_country'] = city.get('country_code_alpha3', city.get('country_code_alpha2', ''))
-                        venues.append(venue)
-
-            logger.info(f"Found {len(venues)} restaurants in {city_name}")
-            time.sleep(DELAY_BETWEEN_REQUESTS)
-            return venues
+        venues = self._fetch_venues_at(city, lat, lon)
+        logger.info(f"Found {len(venues)} restaurants in {city_name}")
+        return venues
 
-        except Exception as e:
-            logger.error(f"Error fetching restaurants for {city_name}: {e}")
-            return []
-
-    def fetch_menu_items_for_restaurant(self, restaurant: Dict) -> List[Dict]:
-        """Fetch all menu items for a given restaurant"""
+    def _fetch_venues_at(self, city: Dict, lat: float, lon: float) -> List[Dict]:
+        """Fetch the venues listed for one coordinate, tagged with their city"""
+        city_name = city.get('name', city.get('slug', 'unknown'))
+        params = {'lat': lat, 'lon': lon}
+        venues = self.transport.get_json(self.restaurants_api, params=params, family=VENUES,
+                                         extract=lambda data: list(iter_venues(data)))
+
+        city_slug = city.get('slug', '')
+        city_country = city.get('country_code_alpha3', city.get('country_code_alpha2', ''))
+        for venue in venues:
+            venue['city'] = city_name
+            venue['city_slug'] = city_slug
+            venue['city_country'] = city_country
+        return venues
+
+    def sweep_restaurants_for_city(self, city: Dict, lat: float, lon: float) -> List[Dict]:
+        """
+        Discover a city's restaurants by probing a grid of tiles around its centre.
+
+        Tiles are fetched concurrently one square ring at a time, and venues are
+        deduplicated by id. The sweep stops once a ring adds fewer than
+        sweep_min_new venues, or after sweep_max_rings rings. A failed tile
+        fails the whole sweep, so the city is retried rather than cut short
+        by a ring that only looked empty.
+        """
+        city_name = city.get('name', city.get('slug', 'unknown'))
+        logger.info(f"Sweeping restaurants for {city_name} around (lat={lat}, lon={lon})")
+
+        def probe(point):
+            try:
+                return self._fetch_venues_at(city, *point)
+            except Exception as e:
+                logger.error(f"Error probing {city_name} at {point}: {e}")
+                self.metrics.inc('wolt_failed_fetches_total', fetch='sweep_tile')
+                raise
+
+        index = VenueIndex()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for ring in range(self.sweep_max_rings + 1):
+                tiles = ring_tiles(lat, lon, ring, self.sweep_spacing_km)
+                new = sum(index.add(venues) for venues in executor.map(probe, tiles))
+                logger.info(f"  Ring {ring}: {len(tiles)} tiles, {new} new restaurants ({len(index)} total)")
+                if ring > 0 and new < self.sweep_min_new:
+                    break
+
+        logger.info(f"Found {len(index)} restaurants in {city_name}")
+        return index.values()
+
+    def fetch_menu_items_for_restaurant(self, restaurant: Dict) -> List[MenuItem]:
+        """Fetch all menu items for a given restaurant; fetch errors are raised for the retry queue"""
         slug = restaurant.get('slug')
         restaurant_name = restaurant.get('name', slug)
 
@@ -118,61 +272,142 @@ class WoltScraper:
             logger.warning(f"No slug for restaurant {restaurant_name}")
             return []
 
+        if self.delta and not (restaurant.get('online', True) and restaurant.get('delivers', True)):
+            return self._closed_menu(restaurant)
+
         logger.info(f"Fetching menu for {restaurant_name} ({slug})")
 
-        try:
-            # First, get the basic venue info to retrieve item IDs
-            url = f"{ITEMS_API}/{slug}/assortment"
-            response = requests.get(url, headers=HEADERS, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-
-            # Extract all item IDs from categories
-            item_ids = []
-            for category in data.get('categories', []):
-                item_ids.extend(category.get('item_ids', []))
-
-            if not item_ids:
-                logger.info(f"No items found for {restaurant_name}")
-                return []
-
-            # Fetch detailed item information
-            items_url = f"{ITEMS_API}/{slug}/assortment/items"
-            payload = {"item_ids": item_ids}
-            headers_with_content = HEADERS.copy()
-            headers_with_content['content-type'] = 'application/json'
-
-            response = requests.post(items_url, json=payload, headers=headers_with_content, timeout=30)
-            response.raise_for_status()
-            items_data = response.json()
-
-            # Process items
-            items = []
-            for item in items_data.get('items', []):
-                item_info = {
-                    'restaurant_id': restaurant.get('id'),
-                    'restaurant_name': restaurant_name,
-                    'restaurant_slug': slug,
-                    'city': restaurant.get('city'),
-                    'item_id': item.get('id'),
-                    'item_name': item.get('name'),
-                    'item_description': item.get('description', ''),
-                    'item_price': item.get('price'),
-                    'item_currency': restaurant.get('currency', 'AZN'),
-                    'item_tags': safe_join(item.get('tags', [])),
-                    'item_has_options': bool(item.get('options')),
-                    'item_vat_percentage': item.get('vat_percentage'),
-                }
-                items.append(item_info)
-
-            logger.info(f"Found {len(items)} menu items for {restaurant_name}")
-            time.sleep(DELAY_BETWEEN_REQUESTS)
-            return items
+        # First, get the basic venue info to retrieve item IDs
+        url = f"{self.items_api}/{slug}/assortment"
+        item_ids, fingerprint = self.transport.get_json(url, family=ASSORTMENT, extract=assortment_layout)
 
-        except Exception as e:
-            logger.error(f"Error fetching menu for {restaurant_name}: {e}")
+        if not item_ids:
+            logger.info(f"No items found for {restaurant_name}")
             return []
 
+        # Process items; restaurant-level columns are shared through one MenuOwner
+        owner = MenuOwner.for_restaurant(restaurant)
+        if self.snapshot is not None:
+            items = self._delta_menu(restaurant, owner, item_ids, fingerprint)
+        else:
+            items = [menu_item(owner, item) for item in self._menu_details(restaurant, item_ids, fingerprint)]
+
+        logger.info(f"Found {len(items)} menu items for {restaurant_name}")
+        return items
+
+    def _menu_details(self, restaurant: Dict, item_ids: List[str], fingerprint: str) -> List[Dict]:
+        """Fetch detailed item information, unless a branch with the same assortment already has"""
+        slug = restaurant.get('slug')
+        if self.shared_menus is None:
+            return self._fetch_item_details(slug, item_ids)
+
+        item_details, shared = self.shared_menus.get_or_fetch(
+            fingerprint, lambda: self._fetch_item_details(slug, item_ids))
+        if shared:
+            logger.info(f"Reusing the item details of an identical menu for {restaurant.get('name', slug)}")
+            self.metrics.inc('wolt_shared_menus_total')
+        return item_details
+
+    def _delta_menu(self, restaurant: Dict, owner: MenuOwner, item_ids: List[str], fingerprint: str) -> List[MenuItem]:
+        """
+        Build a menu from fresh details and the venue's snapshot, then record it.
+
+        In delta mode the whole menu is fetched again when the venue's
+        metadata fingerprint or its assortment layout (which covers the
+        checksum and price of every listed item) changed since the snapshot.
+        Otherwise only item ids that are new or older than delta_max_age are
+        fetched; the rest are carried forward and merged in category order.
+        Without delta every item is fetched and the snapshot is just refreshed.
+        """
+        now = time.time()
+        previous = self.snapshot.previous(restaurant) if self.delta else None
+        carried = {}
+        if (previous is not None and previous.layout == fingerprint and
+                previous.venue_fingerprint == venue_fingerprint(restaurant)):
+            listed = set(item_ids)
+            carried = {row['item_id']: (row, fetched_at) for row, fetched_at in zip(previous.rows, previous.fetched_at)
+                       if row['item_id'] in listed and now - fetched_at <= self.delta_max_age}
+
+        if not carried:
+            # Nothing to carry forward: the whole menu is fetched, as in a full scrape
+            items = [menu_item(owner, item) for item in self._menu_details(restaurant, item_ids, fingerprint)]
+            fetched_at = [now] * len(items)
+            outcome = 'full'
+        else:
+            stale = [item_id for item_id in dict.fromkeys(item_ids) if item_id not in carried]
+            fresh = {}
+            if stale:
+                fresh = {item.get('id'): item for item in self._fetch_item_details(restaurant.get('slug'), stale)}
+            items, fetched_at = [], []
+            for item_id in item_ids:
+                if item_id in fresh:
+                    items.append(menu_item(owner, fresh[item_id]))
+                    fetched_at.append(now)
+                elif item_id in carried:
+                    row, row_fetched_at = carried[item_id]
+                    items.append(MenuItem.from_row(owner, row))
+                    fetched_at.append(row_fetched_at)
+            self.metrics.inc('wolt_delta_items_total', len(stale), source='fetched')
+            self.metrics.inc('wolt_delta_items_total', len(items) - len(fresh), source='carried')
+            outcome = 'partial' if stale else 'unchanged'
+
+        self.metrics.inc('wolt_delta_menus_total', outcome=outcome)
+        self.snapshot.record(restaurant, fingerprint, list(menu_rows(items)), fetched_at)
+        return items
+
+    def _closed_menu(self, restaurant: Dict) -> List[MenuItem]:
+        """A venue that is offline or not delivering keeps its last snapshot menu instead of being fetched"""
+        logger.info(f"Skipping {restaurant.get('name', restaurant.get('slug'))}: not online or not delivering")
+        self.metrics.inc('wolt_delta_menus_total', outcome='closed')
+        previous = self.snapshot.previous(restaurant)
+        return menu_from_rows(restaurant, previous.rows) if previous is not None else []
+
+    def _fetch_item_batch(self, slug: str, item_ids: List[str]) -> List[Dict]:
+        """POST one batch of item ids, retrying just this batch with the retry queue's backoff for its error class"""
+        items_url = f"{self.items_api}/{slug}/assortment/items"
+
+        def count_retry(cls: str, attempts: int):
+            logger.warning(f"Item batch for {slug} failed ({cls}), retry {attempts}/{ITEM_BATCH_RETRIES}")
+            self.metrics.inc('wolt_retries_total', layer='batch', outcome='resent', endpoint=ASSORTMENT_ITEMS,
+                             error_class=cls)
+
+        return self.retry_queue.call(
+            lambda: self.transport.post_json(items_url, {"item_ids": item_ids}, family=ASSORTMENT_ITEMS,
+                                             extract=slim_items),
+            ITEM_BATCH_RETRIES, on_retry=count_retry)
+
+    def _fetch_item_details(self, slug: str, item_ids: List[str]) -> List[Dict]:
+        """
+        Fetch item details in batches of item_batch_size.
+
+        Large menus are split so no single request carries thousands of ids;
+        the batches run concurrently and are concatenated in category order.
+        A failed batch is retried on its own. If it still fails, the menu goes
+        to the retry queue, and the batches that succeeded are kept until
+        then so the retry only fetches the batches that are still missing.
+        """
+        batches = [item_ids[i:i + self.item_batch_size] for i in range(0, len(item_ids), self.item_batch_size)]
+        if len(batches) == 1:
+            return self._fetch_item_batch(slug, batches[0])
+
+        with self.kept_batches_lock:
+            fetched = self.kept_batches.pop(slug, {})
+        keys = [tuple(batch) for batch in batches]
+        missing = [key for key in keys if key not in fetched]
+        logger.info(f"Fetching {len(item_ids)} items for {slug} in {len(missing)} of {len(batches)} batches")
+        futures = {key: self.item_batch_executor.submit(self._fetch_item_batch, slug, list(key)) for key in missing}
+        error = None
+        for key, future in futures.items():
+            try:
+                fetched[key] = future.result()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            with self.kept_batches_lock:
+                self.kept_batches[slug] = fetched
+            raise error
+        return [item for key in keys for item in fetched[key]]
+
     def flatten_restaurant_data(self, restaurant: Dict) -> Dict:
         """Flatten nested restaurant data for CSV export"""
         rating_data = restaurant.get('rating', {})
@@ -204,11 +439,8 @@ class WoltScraper:
             'location_lon': location[0] if len(location) > 0 else None,
         }
 
-    def scrape_all(self):
-        """Main scraping function"""
-        logger.info("Starting Wolt scraper...")
-
-        # Load cities
+    def select_cities(self) -> List[Dict]:
+        """Load cities and apply the country filter and max_cities limit"""
         all_cities = self.load_cities()
 
         # Filter by country if specified
@@ -223,45 +455,324 @@ class WoltScraper:
 
         # Limit cities if max_cities is set
         if self.max_cities:
-            self.cities = all_cities[:self.max_cities]
             logger.info(f"Limited to first {self.max_cities} cities out of {len(all_cities)} total")
+            return all_cities[:self.max_cities]
+        return all_cities
+
+    def scrape_all(self, cities: List[Dict] = None):
+        """Main scraping function; scrapes the given cities, or the configured selection"""
+        logger.info("Starting Wolt scraper...")
+
+        self.cities = cities if cities is not None else self.select_cities()
+
+        # Prices are sketched as menus reach the sink, so charts never need the raw rows
+        self.price_sketch = PriceSketch()
+        if self.stream:
+            sink = StreamingCsvSink(self.output_dir, self.flatten_restaurant_data, sketch=self.price_sketch)
         else:
-            self.cities = all_cities
+            sink = MemorySink(sketch=self.price_sketch)
+        try:
+            with self.metrics.timer('wolt_phase_seconds', phase='scrape'):
+                if self.replay and self.replay_workers > 1:
+                    self._replay_cities_parallel(sink)
+                elif self.engine == 'async':
+                    asyncio.run(self._scrape_cities_async(sink))
+                else:
+                    self._scrape_cities_sequential(sink)
+                self._drain_retries(sink)
+        finally:
+            # Keep whatever finished, even when the run is interrupted
+            sink.close()
+            if self.stream:
+                self.price_sketch.save(f"{self.output_dir}/{PRICE_SKETCH_FILE}")
+            self.dead_letter.write(self.retry_queue.remaining())
+            self.restaurants, self.menu_items = sink.results()
+            self.restaurant_count = sink.restaurant_count
+            self.menu_item_count = sink.menu_item_count
+
+        logger.info(f"Scraping complete! Found {self.restaurant_count} restaurants and {self.menu_item_count} menu items")
+
+    def redrive(self, database_path: str = None):
+        """
+        Retry the fetches in the dead-letter file of an earlier run and merge
+        what is recovered into the CSV files in output_dir, or the database at
+        database_path. Entries get a fresh retry budget; those that still fail
+        are written back to the file.
+        """
+        entries = self.dead_letter.load()
+        if not entries:
+            logger.info(f"Nothing to re-drive in {self.dead_letter.path}")
+            return
+        logger.info(f"Re-driving {len(entries)} dead-lettered fetches from {self.dead_letter.path}")
+
+        # Recovered cities get positions of their own; recovered menus belong to restaurants already written
+        for k, entry in enumerate(entries, 1):
+            positions = (k,) if entry['kind'] == 'city' else (0, k)
+            self.retry_queue.requeue(entry['kind'], entry['item'], positions, entry['error_class'], entry['error'])
+
+        sink = MemorySink(sketch=self.price_sketch)
+        try:
+            with self.metrics.timer('wolt_phase_seconds', phase='redrive'):
+                self._drain_retries(sink)
+        finally:
+            self.restaurants, self.menu_items = sink.results()
+            self.restaurant_count = sink.restaurant_count
+            self.menu_item_count = sink.menu_item_count
+            if database_path:
+                # Recovered cities are not in self.cities; their venues carry the city columns
+                database = WoltDatabase(database_path)
+                try:
+                    database.write([], [self.flatten_restaurant_data(r) for r in self.restaurants], self.menu_items)
+                finally:
+                    database.close()
+            else:
+                merge_into_csv(self.output_dir, [self.flatten_restaurant_data(r) for r in self.restaurants],
+                               self.menu_items)
+            # Without the run's own sketch the recovered prices alone would be wrong; charts then use the CSV
+            sketch_path = Path(self.output_dir) / PRICE_SKETCH_FILE
+            if not database_path and sketch_path.exists():
+                sketch = PriceSketch.load(sketch_path)
+                sketch.merge(self.price_sketch)
+                sketch.save(sketch_path)
+            self.dead_letter.write(self.retry_queue.remaining())
+        logger.info(f"Re-drive recovered {self.restaurant_count} restaurants and {self.menu_item_count} menu items")
+
+    def _restaurants_for_city(self, city: Dict) -> List[Dict]:
+        """Fetch a city's restaurants, reusing the checkpointed list when resuming"""
+        if self.checkpoint is None:
+            return self.fetch_restaurants_for_city(city)
+
+        restaurants = self.checkpoint.city_restaurants(city)
+        if restaurants is not None:
+            logger.info(f"Skipping {city.get('name')}: restaurants already checkpointed")
+            return restaurants
+
+        # Fetch errors raise, so an empty list is a city that really has no restaurants
+        restaurants = self.fetch_restaurants_for_city(city)
+        self.checkpoint.record_city(city, restaurants)
+        return restaurants
+
+    def _menu_for_restaurant(self, restaurant: Dict) -> List[MenuItem]:
+        """Fetch a restaurant's menu, reusing the checkpointed items when resuming"""
+        if self.checkpoint is None:
+            return self.fetch_menu_items_for_restaurant(restaurant)
+
+        rows = self.checkpoint.restaurant_menu(restaurant)
+        if rows is not None:
+            return menu_from_rows(restaurant, rows)
+
+        menu_items = self.fetch_menu_items_for_restaurant(restaurant)
+        self.checkpoint.record_menu(restaurant, list(menu_rows(menu_items)))
+        return menu_items
+
+    def _try_city(self, city_index: int, city: Dict) -> Optional[List[Dict]]:
+        """A city's restaurants, or None when the fetch failed and was queued for retry"""
+        try:
+            return self._restaurants_for_city(city)
+        except Exception as e:
+            self._queue_retry('city', city, (city_index,), e)
+            return None
 
-        # Scrape restaurants for each city
-        all_restaurants = []
-        all_menu_items = []
+    def _try_menu(self, city_index: int, restaurant_index: int, restaurant: Dict) -> Optional[List[MenuItem]]:
+        """A restaurant's menu, or None when the fetch failed and was queued for retry"""
+        try:
+            return self._menu_for_restaurant(restaurant)
+        except Exception as e:
+            self._queue_retry('menu', restaurant, (city_index, restaurant_index), e)
+            return None
+
+    def _queue_retry(self, kind: str, item: Dict, positions: Tuple[int, ...], error: Exception):
+        logger.error(f"Error fetching {kind} {item.get('name', item.get('slug'))}: {error}")
+        self.metrics.inc('wolt_failed_fetches_total', fetch=kind)
+        # Errors not worth retrying go straight to dead and are counted when the queue is drained
+        if self.retry_queue.add(kind, item, positions, error):
+            self._count_retry('queued', kind, error_class(error))
+
+    def _count_retry(self, outcome: str, kind: str, cls: str):
+        self.metrics.inc('wolt_retries_total', layer='queue', outcome=outcome, endpoint=RETRY_ENDPOINTS[kind],
+                         error_class=cls)
+
+    def _drain_retries(self, sink):
+        """
+        Retry the fetches that failed during the main pass, with per-class
+        backoff. Recovered results reach the sink at their original
+        positions; fetches that run out of retries leave an empty city or
+        menu and are kept for the dead-letter file.
+        """
+        if not len(self.retry_queue) and not self.retry_queue.dead:
+            return
+        logger.info(f"Retrying {len(self.retry_queue)} failed fetches")
+
+        def retry(task: RetryTask):
+            self._count_retry('attempted', task.kind, task.error_class)
+            if task.kind == 'city':
+                restaurants = self._restaurants_for_city(task.item)
+                city_index, = task.positions
+                sink.add_restaurants(city_index, restaurants)
+                for j, restaurant in enumerate(restaurants, 1):
+                    menu_items = self._try_menu(city_index, j, restaurant)
+                    if menu_items is not None:
+                        sink.add_menu(city_index, j, restaurant, menu_items)
+            else:
+                sink.add_menu(*task.positions, task.item, self._menu_for_restaurant(task.item))
+            logger.info(f"Recovered {task.kind} {task.item.get('name', task.item.get('slug'))} "
+                        f"(last error: {task.error_class})")
+            self._count_retry('recovered', task.kind, task.error_class)
+
+        def give_up(task: RetryTask):
+            logger.error(f"Giving up on {task.kind} {task.item.get('name', task.item.get('slug'))} "
+                         f"after {task.attempts} failures ({task.error})")
+            self._count_retry('dead', task.kind, task.error_class)
+            if task.kind == 'city':
+                sink.add_restaurants(*task.positions, [])
+            else:
+                sink.add_menu(*task.positions, task.item, [])
+                with self.kept_batches_lock:
+                    self.kept_batches.pop(task.item.get('slug'), None)
 
+        with self.metrics.timer('wolt_phase_seconds', phase='retry'):
+            self.retry_queue.drain(retry, give_up)
+
+    def _scrape_cities_sequential(self, sink):
+        """Scrape cities and restaurants one request at a time"""
         for i, city in enumerate(self.cities, 1):
             logger.info(f"Processing city {i}/{len(self.cities)}: {city.get('name')}")
 
-            # Fetch restaurants
-            restaurants = self.fetch_restaurants_for_city(city)
-            all_restaurants.extend(restaurants)
+            # Fetch restaurants; failures are retried after the main pass
+            restaurants = self._try_city(i, city)
+            if restaurants is None:
+                continue
+            sink.add_restaurants(i, restaurants)
 
             # Fetch menu items for each restaurant
             for j, restaurant in enumerate(restaurants, 1):
                 logger.info(f"  Processing restaurant {j}/{len(restaurants)}")
-                menu_items = self.fetch_menu_items_for_restaurant(restaurant)
-                all_menu_items.extend(menu_items)
+                menu_items = self._try_menu(i, j, restaurant)
+                if menu_items is not None:
+                    sink.add_menu(i, j, restaurant, menu_items)
+
+    async def _scrape_cities_async(self, sink):
+        """
+        Scrape cities and restaurants concurrently.
+
+        The blocking fetchers run on a thread pool, with at most `concurrency`
+        requests in flight per host. Results reach the sink tagged with their
+        city and restaurant positions, so in-memory output is identical to the
+        sequential engine.
+        """
+        loop = asyncio.get_running_loop()
+        host_slots = defaultdict(lambda: asyncio.Semaphore(self.concurrency))
+        hosts = {urlparse(self.restaurants_api).netloc, urlparse(self.items_api).netloc}
+
+        async def run_limited(url: str, fetcher, *args):
+            async with host_slots[urlparse(url).netloc]:
+                return await loop.run_in_executor(executor, fetcher, *args)
+
+        async def scrape_menu(i: int, j: int, restaurant: Dict):
+            menu_items = await run_limited(self.items_api, self._try_menu, i, j, restaurant)
+            if menu_items is not None:
+                sink.add_menu(i, j, restaurant, menu_items)
+
+        async def scrape_city(i: int, city: Dict):
+            logger.info(f"Processing city {i}/{len(self.cities)}: {city.get('name')}")
+            restaurants = await run_limited(self.restaurants_api, self._try_city, i, city)
+            if restaurants is None:
+                return
+            sink.add_restaurants(i, restaurants)
+            await asyncio.gather(*(
+                scrape_menu(i, j, restaurant) for j, restaurant in enumerate(restaurants, 1)
+            ))
+
+        with ThreadPoolExecutor(max_workers=self.concurrency * len(hosts)) as executor:
+            await asyncio.gather(*(
+                scrape_city(i, city) for i, city in enumerate(self.cities, 1)
+            ))
+
+    def _replay_options(self) -> Dict:
+        """Options that make a worker process replay exactly the requests this scraper would"""
+        return {
+            'cities_file': self.cities_file, 'base_url': self.base_url,
+            'item_batch_size': self.item_batch_size, 'sweep': self.sweep,
+            'sweep_spacing_km': self.sweep_spacing_km, 'sweep_max_rings': self.sweep_max_rings,
+            'sweep_min_new': self.sweep_min_new, 'archive_dir': self.archive_dir,
+            'replay': True, 'replay_as_of': self.replay_as_of, 'share_menus': self.shared_menus is not None,
+        }
 
-        self.restaurants = all_restaurants
-        self.menu_items = all_menu_items
+    def _replay_cities_parallel(self, sink):
+        """
+        Rebuild results from the archive on a process pool.
 
-        logger.info(f"Scraping complete! Found {len(self.restaurants)} restaurants and {len(self.menu_items)} menu items")
+        Venue lists are replayed here; menus, where nearly all the decoding
+        work is, are replayed by worker processes in chunks of REPLAY_CHUNK
+        restaurants and reach the sink in input order.
+        """
+        tasks = []
+        for i, city in enumerate(self.cities, 1):
+            restaurants = self._try_city(i, city)
+            if restaurants is None:
+                continue
+            sink.add_restaurants(i, restaurants)
+            tasks.extend((i, j, restaurant) for j, restaurant in enumerate(restaurants, 1))
+
+        chunks = [tasks[k:k + REPLAY_CHUNK] for k in range(0, len(tasks), REPLAY_CHUNK)]
+        logger.info(f"Replaying {len(tasks)} menus in {len(chunks)} chunks on {self.replay_workers} processes")
+        # Spawned workers: this process already runs threads, which fork does not copy safely
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.replay_workers, mp_context=context,
+                                 initializer=_init_replay_worker, initargs=(self._replay_options(),)) as pool:
+            restaurant_chunks = [[restaurant for _, _, restaurant in chunk] for chunk in chunks]
+            for chunk, menus in zip(chunks, pool.map(_replay_menus, restaurant_chunks)):
+                for (i, j, restaurant), menu_items in zip(chunk, menus):
+                    # A worker's failure is retried here, where its error can be queued
+                    if menu_items is None:
+                        menu_items = self._try_menu(i, j, restaurant)
+                    if menu_items is not None:
+                        sink.add_menu(i, j, restaurant, menu_items)
+
+    def close(self):
+        """Release worker threads, network connections and the checkpoint store, then dump metrics"""
+        self.item_batch_executor.shutdown()
+        self.transport.close()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+        self.write_metrics()
+
+    def write_metrics(self):
+        """Log a metrics summary and write the JSON dump and Prometheus file, when configured"""
+        self.metrics.set('wolt_restaurants', self.restaurant_count)
+        self.metrics.set('wolt_menu_items', self.menu_item_count)
+        for family, bucket in self.rate_limiter.buckets.items():
+            self.metrics.set('wolt_rate_limit', bucket.rate, endpoint=family)
+
+        for line in self.metrics.summary():
+            logger.info(f"  {line}")
+        self.metrics.stop_export()
+        if self.metrics_file:
+            self.metrics.write_json(self.metrics_file)
+            logger.info(f"Saved metrics to {self.metrics_file}")
+        if self.prometheus_file:
+            self.metrics.write_prometheus(self.prometheus_file)
 
     def save_to_csv(self, output_dir: str = "data"):
         """Save scraped data to CSV files"""
+        with self.metrics.timer('wolt_phase_seconds', phase='save_csv'):
+            self._write_csv(output_dir)
+
+    def _write_csv(self, output_dir: str):
         Path(output_dir).mkdir(exist_ok=True)
 
+        # Flatten each restaurant once; the combined file reuses these rows
+        flattened_restaurants = [self.flatten_restaurant_data(r) for r in self.restaurants]
+
         # Save restaurants
         restaurants_file = f"{output_dir}/restaurants.csv"
-        if self.restaurants:
-            logger.info(f"Saving {len(self.restaurants)} restaurants to {restaurants_file}")
-            flattened_restaurants = [self.flatten_restaurant_data(r) for r in self.restaurants]
+        if flattened_restaurants:
+            logger.info(f"Saving {len(flattened_restaurants)} restaurants to {restaurants_file}")
 
             with open(restaurants_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=flattened_restaurants[0].keys())
+                writer = csv.DictWriter(f, fieldnames=RESTAURANT_FIELDS)
                 writer.writeheader()
                 writer.writerows(flattened_restaurants)
 
@@ -271,84 +782,214 @@ class WoltScraper:
             logger.info(f"Saving {len(self.menu_items)} menu items to {menu_file}")
 
             with open(menu_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=self.menu_items[0].keys())
+                writer = csv.DictWriter(f, fieldnames=MENU_ITEM_FIELDS)
                 writer.writeheader()
-                writer.writerows(self.menu_items)
+                writer.writerows(menu_rows(self.menu_items))
 
         # Save combined data (restaurants with their menu items in a denormalized format)
         combined_file = f"{output_dir}/restaurants_with_menu.csv"
         logger.info(f"Saving combined data to {combined_file}")
 
-        combined_data = []
-        for restaurant in self.restaurants:
-            restaurant_flat = self.flatten_restaurant_data(restaurant)
+        if flattened_restaurants:
+            # One pass to index items by restaurant, one pass to join and stream rows out
+            items_by_restaurant = group_by_restaurant(self.menu_items)
+            with open(combined_file, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=COMBINED_FIELDS)
+                writer.writeheader()
+                writer.writerows(iter_combined_rows(flattened_restaurants, items_by_restaurant))
 
-            # Find menu items for this restaurant
-            restaurant_menu_items = [
-                item for item in self.menu_items
-                if item.get('restaurant_id') == restaurant.get('id')
-            ]
+        # Written after the CSV files, so a sketch newer than menu_items.csv describes it
+        self.price_sketch.save(f"{output_dir}/{PRICE_SKETCH_FILE}")
 
-            if restaurant_menu_items:
-                for menu_item in restaurant_menu_items:
-                    combined_row = {**restaurant_flat, **menu_item}
-                    combined_data.append(combined_row)
-            else:
-                # Restaurant with no menu items
-                combined_data.append(restaurant_flat)
+        logger.info("All data saved successfully!")
 
-        if combined_data:
-            with open(combined_file, 'w', newline='', encoding='utf-8') as f:
-                # Get all unique keys from combined data
-                all_keys = set()
-                for row in combined_data:
-                    all_keys.update(row.keys())
+    def save_to_sqlite(self, path: str = DEFAULT_DATABASE):
+        """Save scraped data to a SQLite database instead of CSV files, replacing the venues and menus scraped"""
+        with self.metrics.timer('wolt_phase_seconds', phase='save_sqlite'):
+            database = WoltDatabase(path)
+            try:
+                database.write(self.cities, [self.flatten_restaurant_data(r) for r in self.restaurants],
+                               self.menu_items)
+            finally:
+                database.close()
 
-                writer = csv.DictWriter(f, fieldnames=sorted(all_keys))
-                writer.writeheader()
-                writer.writerows(combined_data)
+    def save_to_parquet(self, output_dir: str = "data"):
+        """Convert the CSV files in output_dir to typed Parquet files (requires pyarrow)"""
+        with self.metrics.timer('wolt_phase_seconds', phase='save_parquet'):
+            export_parquet(output_dir)
 
-        logger.info("All data saved successfully!")
+
+_replay_scraper = None
+
+
+def _init_replay_worker(options: Dict):
+    """Give each replay worker process one archive-backed scraper"""
+    global _replay_scraper
+    logging.getLogger().setLevel(logging.WARNING)
+    _replay_scraper = WoltScraper(**options)
+
+
+def _replay_menu(restaurant: Dict) -> Optional[List[MenuItem]]:
+    try:
+        return _replay_scraper.fetch_menu_items_for_restaurant(restaurant)
+    except Exception:
+        return None
+
+
+def _replay_menus(restaurants: List[Dict]) -> List[Optional[List[MenuItem]]]:
+    """Replay a chunk of menus; None marks a menu that failed"""
+    return [_replay_menu(restaurant) for restaurant in restaurants]
+
+
+def parse_timestamp(value: str) -> float:
+    """Unix seconds or an ISO 8601 date/time"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description="Scrape Wolt restaurants and their menus to CSV")
+    parser.add_argument('max_cities', nargs='?', default=None,
+                        help="Maximum number of cities to scrape (default: all)")
+    parser.add_argument('country', nargs='?', default="AZ",
+                        help="Country code filter, alpha-2 or alpha-3 (default: AZ)")
+    parser.add_argument('--engine', choices=ENGINES, default='sequential',
+                        help="Scraping engine (default: sequential)")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"In-flight requests per host for the async engine (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help=f"Starting requests/s per endpoint family (default: {DEFAULT_RATE})")
+    parser.add_argument('--max-rate', type=float, default=MAX_RATE,
+                        help=f"Ceiling the adaptive rate limiter may climb to (default: {MAX_RATE})")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Directory for the on-disk HTTP response cache (default: no cache)")
+    parser.add_argument('--cache-size-mb', type=float, default=DEFAULT_CACHE_SIZE_MB,
+                        help=f"Size bound of the response cache in MB (default: {DEFAULT_CACHE_SIZE_MB})")
+    parser.add_argument('--checkpoint', default=None,
+                        help=f"Record finished cities and menus in this SQLite file (default with --resume: <output-dir>/{CHECKPOINT_FILE})")
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip cities and restaurants already recorded in the checkpoint")
+    parser.add_argument('--stream', action='store_true',
+                        help="Write CSV rows as each fetch completes instead of holding everything in memory")
+    parser.add_argument('--output-dir', default="data",
+                        help="Directory for the CSV files (default: data)")
+    parser.add_argument('--item-batch-size', type=int, default=ITEM_BATCH_SIZE,
+                        help=f"Item ids per assortment/items request (default: {ITEM_BATCH_SIZE})")
+    parser.add_argument('--no-shared-menus', dest='share_menus', action='store_false',
+                        help="Fetch item details for every branch, even when its assortment matches another's")
+    parser.add_argument('--snapshot', default=None,
+                        help=f"Record every venue's menu in this SQLite file (default with --delta: <output-dir>/{SNAPSHOT_FILE})")
+    parser.add_argument('--delta', action='store_true',
+                        help="Fetch only item ids that are new or possibly changed since the snapshot, "
+                             "and skip venues that are offline or not delivering")
+    parser.add_argument('--delta-max-age-days', type=float, default=DEFAULT_MAX_AGE_DAYS,
+                        help=f"Fetch items again once their snapshot is this old (default: {DEFAULT_MAX_AGE_DAYS})")
+    parser.add_argument('--dead-letter', default=None,
+                        help=f"Where fetches that keep failing are recorded (default: <output-dir>/{DEAD_LETTER_FILE})")
+    parser.add_argument('--redrive', action='store_true',
+                        help="Only retry the dead-lettered fetches and merge them into the CSVs in --output-dir")
+    parser.add_argument('--sweep', action='store_true',
+                        help="Discover venues by probing a grid of tiles around each city centre")
+    parser.add_argument('--sweep-spacing-km', type=float, default=DEFAULT_TILE_SPACING_KM,
+                        help=f"Distance between sweep probes (default: {DEFAULT_TILE_SPACING_KM})")
+    parser.add_argument('--sweep-max-rings', type=int, default=DEFAULT_MAX_RINGS,
+                        help=f"Maximum rings of tiles around the centre (default: {DEFAULT_MAX_RINGS})")
+    parser.add_argument('--sqlite', nargs='?', const=DEFAULT_DATABASE, default=None, metavar='PATH',
+                        help=f"Save to an indexed SQLite database instead of CSV files (default path: {DEFAULT_DATABASE})")
+    parser.add_argument('--parquet', action='store_true',
+                        help="Also write Parquet copies of the CSV files (requires pyarrow)")
+    parser.add_argument('--base-url', default=BASE_URL,
+                        help="API base URL, e.g. a local wolt_mock_server (default: the Wolt consumer API)")
+    parser.add_argument('--archive', default=None,
+                        help="Record every raw response into this archive directory (with --replay: read from it)")
+    parser.add_argument('--replay', action='store_true',
+                        help="Rebuild the outputs from --archive without network access")
+    parser.add_argument('--replay-as-of', type=parse_timestamp, default=None,
+                        help="Replay responses fetched no later than this time (unix seconds or ISO 8601)")
+    parser.add_argument('--replay-workers', type=int, default=multiprocessing.cpu_count(),
+                        help="Processes used to replay menus (default: all cores)")
+    parser.add_argument('--metrics-file', default=None,
+                        help="Where to write the end-of-run metrics as JSON (default: <output-dir>/metrics.json)")
+    parser.add_argument('--prometheus-file', default=None,
+                        help="Keep a live Prometheus text-format metrics file updated during the run")
+    args = parser.parse_args(argv)
+    if args.sqlite and args.stream:
+        parser.error("--sqlite saves the results held in memory and cannot be combined with --stream")
+    if args.sqlite and args.parquet:
+        parser.error("--parquet converts the CSV files, which --sqlite does not write")
+    return args
 
 
 def main():
     """Main entry point"""
-    import sys
+    args = parse_args()
 
     # Parse command-line arguments
     max_cities = None
-    country_filter = "AZ"  # Default to Azerbaijan
+    country_filter = args.country  # Defaults to Azerbaijan
 
-    if len(sys.argv) > 1:
+    if args.max_cities is not None:
         try:
-            max_cities = int(sys.argv[1])
+            max_cities = int(args.max_cities)
             logger.info(f"Limiting scrape to {max_cities} cities")
         except ValueError:
-            logger.warning(f"Invalid max_cities argument: {sys.argv[1]}. Scraping all cities.")
-
-    if len(sys.argv) > 2:
-        country_filter = sys.argv[2]
-        logger.info(f"Filtering by country: {country_filter}")
-
-    scraper = WoltScraper(max_cities=max_cities, country_filter=country_filter)
+            logger.warning(f"Invalid max_cities argument: {args.max_cities}. Scraping all cities.")
+
+    logger.info(f"Filtering by country: {country_filter}")
+
+    scraper = WoltScraper(max_cities=max_cities, country_filter=country_filter,
+                          engine=args.engine, concurrency=args.concurrency,
+                          rate=args.rate, max_rate=args.max_rate,
+                          cache_dir=args.cache_dir, cache_size_mb=args.cache_size_mb,
+                          checkpoint_path=args.checkpoint, resume=args.resume,
+                          stream=args.stream, output_dir=args.output_dir,
+                          item_batch_size=args.item_batch_size, share_menus=args.share_menus,
+                          snapshot_path=args.snapshot, delta=args.delta, delta_max_age_days=args.delta_max_age_days,
+                          sweep=args.sweep, sweep_spacing_km=args.sweep_spacing_km,
+                          sweep_max_rings=args.sweep_max_rings,
+                          metrics_file=args.metrics_file or f"{args.output_dir}/metrics.json",
+                          prometheus_file=args.prometheus_file, base_url=args.base_url,
+                          archive_dir=args.archive, replay=args.replay, replay_as_of=args.replay_as_of,
+                          replay_workers=args.replay_workers, dead_letter_path=args.dead_letter)
+
+    if args.redrive:
+        try:
+            scraper.redrive(database_path=args.sqlite)
+        finally:
+            scraper.close()
+        return
+
+    def save():
+        # Streamed rows are already on disk
+        if args.sqlite:
+            scraper.save_to_sqlite(args.sqlite)
+        elif not scraper.stream:
+            scraper.save_to_csv(args.output_dir)
 
     try:
         scraper.scrape_all()
-        scraper.save_to_csv()
+        save()
+        if args.parquet:
+            scraper.save_to_parquet(args.output_dir)
 
         logger.info("=" * 60)
         logger.info("SCRAPING COMPLETED SUCCESSFULLY!")
-        logger.info(f"Total restaurants: {len(scraper.restaurants)}")
-        logger.info(f"Total menu items: {len(scraper.menu_items)}")
+        logger.info(f"Total restaurants: {scraper.restaurant_count}")
+        logger.info(f"Total menu items: {scraper.menu_item_count}")
         logger.info("=" * 60)
 
     except KeyboardInterrupt:
         logger.info("\n\nScraping interrupted by user. Saving partial data...")
-        scraper.save_to_csv()
+        save()
     except Exception as e:
         logger.error(f"Fatal error: {e}", exc_info=True)
         logger.info("Attempting to save partial data...")
-        scraper.save_to_csv()
+        save()
+    finally:
+        scraper.close()
 
 
 if __name__ == "__main__":
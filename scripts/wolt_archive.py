@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Wolt Response Archive
+Append-only, compressed store of every raw API response, indexed by venue slug
+and fetch time, for rebuilding outputs offline
+"""
+
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+
+from wolt_cache import cache_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_MB = 256  # body segment size before a new segment file is started
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bodies (
+    sha TEXT PRIMARY KEY,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS responses (
+    id INTEGER PRIMARY KEY,
+    request_key TEXT NOT NULL,
+    family TEXT NOT NULL,
+    method TEXT NOT NULL,
+    url TEXT NOT NULL,
+    params TEXT,
+    slug TEXT,
+    fetched_at REAL NOT NULL,
+    body_sha TEXT NOT NULL,
+    payload_key TEXT
+);
+CREATE INDEX IF NOT EXISTS responses_request ON responses (request_key, fetched_at);
+CREATE INDEX IF NOT EXISTS responses_slug ON responses (slug, fetched_at);
+"""
+
+_VENUE_SLUG = re.compile(r"/venues/slug/([^/]+)/assortment")
+
+
+def payload_key(method: str, body: Optional[str]) -> Optional[str]:
+    """Key of a request body regardless of URL, or None for requests without one"""
+    if not body:
+        return None
+    return hashlib.sha256(f"{method.upper()} {body}".encode('utf-8')).hexdigest()
+
+
+def venue_slug(url: str) -> Optional[str]:
+    """The venue slug of an assortment URL, or None for other endpoints"""
+    match = _VENUE_SLUG.search(url)
+    return match.group(1) if match else None
+
+
+class ResponseArchive:
+    """
+    Raw response bodies in append-only segment files, with a SQLite index.
+
+    Bodies are zlib-compressed and stored once per distinct content, so an
+    unchanged response fetched on every run costs one index row, not another
+    copy. Each index row records the request (its cache key, URL and query
+    parameters), the venue slug for assortment endpoints, and when it was
+    fetched, so any past run can be replayed with as_of. POSTs are also
+    indexed by their body alone, for branches that reused another branch's
+    item details instead of fetching them. Segments are only
+    ever appended to; bytes left by a crash before the index commit are
+    simply unreferenced. One process records into an archive at a time;
+    any number may read it.
+    """
+
+    def __init__(self, archive_dir: str, readonly: bool = False, segment_mb: float = DEFAULT_SEGMENT_MB):
+        self.archive_dir = Path(archive_dir)
+        self.readonly = readonly
+        self.segment_bytes = int(segment_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        index_path = self.archive_dir / "index.sqlite"
+        if readonly:
+            if not index_path.exists():
+                raise FileNotFoundError(f"No response archive at {archive_dir}")
+            self.conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(str(index_path), check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+            # Archives recorded before payload keys existed gain the column; their old rows stay unkeyed
+            if not self._has_payload_keys():
+                self.conn.execute("ALTER TABLE responses ADD COLUMN payload_key TEXT")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS responses_payload ON responses (payload_key, fetched_at)")
+        self.payload_keys = self._has_payload_keys()
+        self.readers: Dict[int, int] = {}
+        self.writer = None
+        self.segment = 0
+
+    def _has_payload_keys(self) -> bool:
+        return any(row[1] == 'payload_key' for row in self.conn.execute("PRAGMA table_info(responses)"))
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.archive_dir / f"segment-{segment:05d}.bin"
+
+    def _open_writer(self):
+        """Append to the newest segment, starting another once it is full"""
+        if self.writer is None:
+            self.segment = self.conn.execute("SELECT MAX(segment) FROM bodies").fetchone()[0] or 1
+            self.writer = open(self._segment_path(self.segment), 'ab')
+        if self.writer.tell() >= self.segment_bytes:
+            self.writer.close()
+            self.segment += 1
+            self.writer = open(self._segment_path(self.segment), 'ab')
+
+    def record(self, family: str, method: str, url: str, params: Optional[Dict[str, Any]],
+               body: Optional[str], content: bytes, fetched_at: Optional[float] = None):
+        """Archive one response to the request described by method, url, params and body"""
+        sha = hashlib.sha256(content).hexdigest()
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM bodies WHERE sha = ?", (sha,)).fetchone() is None:
+                self._open_writer()
+                compressed = zlib.compress(content)
+                offset = self.writer.tell()
+                self.writer.write(compressed)
+                self.writer.flush()
+                self.conn.execute("INSERT INTO bodies (sha, segment, offset, length) VALUES (?, ?, ?, ?)",
+                                  (sha, self.segment, offset, len(compressed)))
+            self.conn.execute(
+                "INSERT INTO responses (request_key, family, method, url, params, slug, fetched_at, body_sha, "
+                "payload_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (cache_key(method, url, params, body), family, method.upper(), url,
+                 json.dumps(params, sort_keys=True) if params else None, venue_slug(url),
+                 fetched_at or time.time(), sha, payload_key(method, body))
+            )
+            self.conn.commit()
+
+    def _reader(self, segment: int) -> int:
+        fd = self.readers.get(segment)
+        if fd is None:
+            fd = self.readers[segment] = os.open(self._segment_path(segment), os.O_RDONLY)
+        return fd
+
+    def _read_latest(self, column: str, key: str, as_of: Optional[float]) -> Optional[bytes]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT b.segment, b.offset, b.length FROM responses r JOIN bodies b ON b.sha = r.body_sha "
+                f"WHERE r.{column} = ? AND r.fetched_at <= ? ORDER BY r.fetched_at DESC LIMIT 1",
+                (key, as_of if as_of is not None else float('inf'))
+            ).fetchone()
+            if row is None:
+                return None
+            segment, offset, length = row
+            fd = self._reader(segment)
+        # pread does not move a shared file position, so reads run outside the lock
+        return zlib.decompress(os.pread(fd, length, offset))
+
+    def lookup(self, method: str, url: str, params: Optional[Dict[str, Any]] = None,
+               body: Optional[str] = None, as_of: Optional[float] = None) -> Optional[bytes]:
+        """The latest archived body for a request, fetched no later than as_of when given"""
+        return self._read_latest('request_key', cache_key(method, url, params, body), as_of)
+
+    def lookup_payload(self, method: str, body: str, as_of: Optional[float] = None) -> Optional[bytes]:
+        """The latest archived body for a request with this body to any URL"""
+        key = payload_key(method, body)
+        return self._read_latest('payload_key', key, as_of) if key and self.payload_keys else None
+
+    def history(self, slug: str) -> List[Tuple[float, str, str]]:
+        """(fetched_at, family, url) of every archived response for a venue slug, oldest first"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT fetched_at, family, url FROM responses WHERE slug = ? ORDER BY fetched_at", (slug,)
+            ).fetchall()
+
+    def close(self):
+        with self.lock:
+            if self.writer is not None:
+                self.writer.close()
+            for fd in self.readers.values():
+                os.close(fd)
+            self.readers.clear()
+            self.conn.close()
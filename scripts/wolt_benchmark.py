@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Wolt Scraper Benchmarks
+End-to-end WoltScraper runs against the local mock API, reporting requests/s,
+wall time and peak memory per scenario, with optional regression checks
+"""
+
+import sys
+import json
+import time
+import resource
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict
+import logging
+
+from wolt_mock_server import MockWoltData, MockWoltServer
+
+logger = logging.getLogger(__name__)
+
+# The mock has no production limits, so the limiter is opened up unless a scenario says otherwise
+BENCH_RATE = 1000.0
+
+DEFAULT_TOLERANCE = 0.15  # relative slowdown reported as a regression
+DEFAULT_VENUES = 100  # venues served per city, keeping a full suite to a few minutes
+
+# Scenario name -> (WoltScraper options, MockWoltServer options).
+# The mock serves every venue the same assortment, so with shared menus a
+# whole run would make a single assortment/items request; scenarios turn
+# sharing off to keep that endpoint under load, and async-shared measures
+# the best case of sharing on its own.
+SCENARIOS = {
+    'sequential': ({'engine': 'sequential', 'share_menus': False}, {}),
+    'async': ({'engine': 'async', 'share_menus': False}, {}),
+    'async-latency': ({'engine': 'async', 'share_menus': False}, {'latency': 0.02, 'jitter': 0.03}),
+    'async-errors': ({'engine': 'async', 'share_menus': False}, {'error_rate': 0.02}),
+    'async-throttle': ({'engine': 'async', 'share_menus': False}, {'throttle_rate': 0.02, 'retry_after': 0.2}),
+    'async-stream': ({'engine': 'async', 'stream': True, 'share_menus': False}, {}),
+    'async-shared': ({'engine': 'async'}, {}),
+}
+
+
+def _run_scraper(base_url: str, options: Dict) -> Dict:
+    """Run one scrape in a fresh process and measure it"""
+    logging.getLogger().setLevel(logging.WARNING)
+    from scrape_wolt_restaurants import WoltScraper
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        scraper = WoltScraper(base_url=base_url, output_dir=output_dir,
+                              **{'rate': BENCH_RATE, 'max_rate': BENCH_RATE, **options})
+        start = time.perf_counter()
+        try:
+            scraper.scrape_all()
+            if not scraper.stream:
+                scraper.save_to_csv(output_dir)
+            wall = time.perf_counter() - start
+        finally:
+            scraper.close()
+
+    snapshot = scraper.metrics.snapshot()
+    requests = sum(counter['value'] for counter in snapshot['counters'] if counter['name'] == 'wolt_requests_total')
+    return {
+        'wall_seconds': wall,
+        'requests': int(requests),
+        'requests_per_second': requests / wall if wall else 0.0,
+        'restaurants': scraper.restaurant_count,
+        'menu_items': scraper.menu_item_count,
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+    }
+
+
+def run_scenario(name: str, scraper_options: Dict, data: MockWoltData, repeat: int = 1) -> Dict:
+    """Run a scenario repeat times against its own mock server and keep the median run"""
+    options, server_options = SCENARIOS[name]
+    runs = []
+    for _ in range(repeat):
+        with MockWoltServer(data, port=0, **server_options) as server:
+            # Each run gets a new process so peak memory is the scraper's alone
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                result = executor.submit(_run_scraper, server.base_url, {**scraper_options, **options}).result()
+            result['server'] = dict(server.counts)
+        runs.append(result)
+    runs.sort(key=lambda run: run['wall_seconds'])
+    return {'scenario': name, 'runs': len(runs), **runs[len(runs) // 2]}
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """Describe scenarios whose throughput dropped more than tolerance below the baseline"""
+    previous = {result['scenario']: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result['scenario'])
+        if not before or not before['requests_per_second']:
+            continue
+        change = result['requests_per_second'] / before['requests_per_second'] - 1
+        if change < -tolerance:
+            regressions.append(f"{result['scenario']}: {before['requests_per_second']:.1f} -> "
+                               f"{result['requests_per_second']:.1f} req/s ({change:+.0%})")
+    return regressions
+
+
+def format_table(results: List[Dict]) -> str:
+    header = f"{'scenario':<16}{'wall s':>9}{'requests':>10}{'req/s':>9}{'items':>9}{'peak MB':>9}  server"
+    lines = [header, '-' * len(header)]
+    for r in results:
+        lines.append(f"{r['scenario']:<16}{r['wall_seconds']:>9.2f}{r['requests']:>10}"
+                     f"{r['requests_per_second']:>9.1f}{r['menu_items']:>9}{r['peak_rss_mb']:>9.1f}  "
+                     f"{r['server']['errors']} errors, {r['server']['throttled']} throttled")
+    return '\n'.join(lines)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description="Benchmark WoltScraper end to end against the mock API")
+    parser.add_argument('scenarios', nargs='*', default=list(SCENARIOS),
+                        help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument('--cities', type=int, default=3, help="Cities scraped per run (default: 3)")
+    parser.add_argument('--country', default="AZ", help="Country whose cities are scraped (default: AZ)")
+    parser.add_argument('--venues', type=int, default=DEFAULT_VENUES,
+                        help=f"Venues the mock serves per city (default: {DEFAULT_VENUES})")
+    parser.add_argument('--concurrency', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per scenario; the median is reported")
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    parser.add_argument('--baseline', default=None, help="Earlier --output file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Allowed relative req/s drop against the baseline (default: {DEFAULT_TOLERANCE})")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    return args
+
+
+def main():
+    """Main entry point"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+
+    scraper_options = {'max_cities': args.cities, 'country_filter': args.country}
+    if args.concurrency:
+        scraper_options['concurrency'] = args.concurrency
+
+    data = MockWoltData(venues_per_city=args.venues, cap_recorded=True)
+    results = []
+    for name in args.scenarios:
+        logger.info(f"Running {name}...")
+        results.append(run_scenario(name, scraper_options, data, repeat=args.repeat))
+    print(format_table(results))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Saved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Wolt Response Cache
+Persistent, size-bounded HTTP response cache with TTLs and revalidation
+"""
+
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional, NamedTuple
+import logging
+
+from wolt_ratelimit import VENUES, ASSORTMENT, ASSORTMENT_ITEMS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE_MB = 512
+
+# How long a cached response is served without asking the API (seconds)
+DEFAULT_TTLS = {
+    VENUES: 6 * 3600,
+    ASSORTMENT: 24 * 3600,
+    ASSORTMENT_ITEMS: 24 * 3600,
+}
+DEFAULT_TTL = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    family TEXT NOT NULL,
+    url TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+
+def cache_key(method: str, url: str, params: Optional[Dict[str, Any]] = None, body: Optional[str] = None) -> str:
+    """Build a stable cache key from the endpoint, query parameters and request body"""
+    parts = [method.upper(), url, json.dumps(params or {}, sort_keys=True), body or '']
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of raw response bodies.
+
+    Entries younger than their endpoint family's TTL are served as-is. Older
+    entries keep their ETag/Last-Modified validators so the transport can
+    revalidate them with a conditional request. When the stored bodies exceed
+    max_size_mb the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: str, max_size_mb: float = DEFAULT_CACHE_SIZE_MB,
+                 ttls: Optional[Dict[str, float]] = None):
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        self.path = Path(cache_dir) / "responses.sqlite"
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def ttl(self, family: str) -> float:
+        return self.ttls.get(family, DEFAULT_TTL)
+
+    def get(self, key: str, family: str) -> Optional[CachedResponse]:
+        """Look up a response, marking it as recently used"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            body, etag, last_modified, stored_at = row
+            now = time.time()
+            self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+        fresh = now - stored_at < self.ttl(family)
+        return CachedResponse(zlib.decompress(body), etag, last_modified, fresh)
+
+    def put(self, key: str, family: str, url: str, body: bytes,
+            etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Store a response body and evict old entries if over the size bound"""
+        compressed = zlib.compress(body)
+        now = time.time()
+        with self.lock:
+            previous = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, family, url, body, size, etag, last_modified, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, family, url, compressed, len(compressed), etag, last_modified, now, now)
+            )
+            self.total_bytes += len(compressed) - (previous[0] if previous else 0)
+            self._evict()
+            self.conn.commit()
+
+    def touch(self, key: str):
+        """Restart an entry's TTL after a 304 Not Modified"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+            self.conn.commit()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits its size bound"""
+        if self.total_bytes <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            if self.total_bytes <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.total_bytes -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} cached responses ({self.total_bytes / 1024 / 1024:.1f} MB kept)")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Wolt Scrape Checkpoints
+Durable SQLite record of finished cities and restaurant menus for resumable runs
+"""
+
+import json
+import zlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = "checkpoint.sqlite"  # in the run's output directory unless a path is given
+DEFAULT_CHECKPOINT = f"data/{CHECKPOINT_FILE}"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cities (
+    city_key TEXT PRIMARY KEY,
+    restaurants BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS menus (
+    city_slug TEXT NOT NULL,
+    restaurant_slug TEXT NOT NULL,
+    items BLOB NOT NULL,
+    PRIMARY KEY (city_slug, restaurant_slug)
+);
+"""
+
+
+def _pack(rows: List[Dict]) -> bytes:
+    return zlib.compress(json.dumps(rows, ensure_ascii=False).encode('utf-8'))
+
+
+def _unpack(blob: bytes) -> List[Dict]:
+    return json.loads(zlib.decompress(blob))
+
+
+def city_key(city: Dict) -> str:
+    """Identify a city across runs"""
+    return city.get('id') or city.get('slug') or city.get('name', '')
+
+
+class CheckpointStore:
+    """
+    Records each city's venue list and each restaurant's menu as soon as it is
+    fetched. Every record is committed immediately (WAL journal), so a killed
+    process loses at most the requests that were in flight.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT, resume: bool = False):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        if not resume and Path(path).exists():
+            logger.info(f"Starting a fresh checkpoint at {path}")
+            Path(path).unlink()
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if resume:
+            cities, menus = self.counts()
+            logger.info(f"Resuming from {path}: {cities} cities and {menus} menus already done")
+
+    def counts(self):
+        with self.lock:
+            cities = self.conn.execute("SELECT COUNT(*) FROM cities").fetchone()[0]
+            menus = self.conn.execute("SELECT COUNT(*) FROM menus").fetchone()[0]
+        return cities, menus
+
+    def city_restaurants(self, city: Dict) -> Optional[List[Dict]]:
+        """Return the recorded venue list for a finished city, or None"""
+        with self.lock:
+            row = self.conn.execute("SELECT restaurants FROM cities WHERE city_key = ?", (city_key(city),)).fetchone()
+        return _unpack(row[0]) if row else None
+
+    def record_city(self, city: Dict, restaurants: List[Dict]):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO cities (city_key, restaurants) VALUES (?, ?)",
+                              (city_key(city), _pack(restaurants)))
+            self.conn.commit()
+
+    def restaurant_menu(self, restaurant: Dict) -> Optional[List[Dict]]:
+        """Return the recorded menu items for a finished restaurant, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT items FROM menus WHERE city_slug = ? AND restaurant_slug = ?",
+                (restaurant.get('city_slug', ''), restaurant.get('slug'))
+            ).fetchone()
+        return _unpack(row[0]) if row else None
+
+    def record_menu(self, restaurant: Dict, items: List[Dict]):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO menus (city_slug, restaurant_slug, items) VALUES (?, ?, ?)",
+                (restaurant.get('city_slug', ''), restaurant.get('slug'), _pack(items))
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Wolt Dataset Loader
+Typed, column-selective loading of the scraper's output tables for analysis scripts
+"""
+
+from pathlib import Path
+import pandas as pd
+
+from wolt_output import RESTAURANT_FIELDS, MENU_ITEM_FIELDS, COMBINED_FIELDS
+from wolt_sqlite import SQL_TABLES
+
+DATA_DIR = Path("data")
+
+TABLE_FIELDS = {
+    'restaurants': RESTAURANT_FIELDS,
+    'menu_items': MENU_ITEM_FIELDS,
+    'restaurants_with_menu': COMBINED_FIELDS,
+}
+
+# Analysis dtypes by column name; unlisted columns load as strings.
+# Repeated labels are categorical. Integer-valued columns that can be missing
+# and stay well below 2**24 (prices in cents, ranges, minutes) use float32,
+# which holds them exactly. Fractional columns, and counts that are summed
+# across venues, use float64.
+COLUMN_DTYPES = {
+    # restaurants
+    'slug': 'category',
+    'city': 'category',
+    'city_slug': 'category',
+    'country': 'category',
+    'online': 'boolean',
+    'delivers': 'boolean',
+    'product_line': 'category',
+    'currency': 'category',
+    'price_range': 'float32',
+    'delivery_price_int': 'float32',
+    'estimate_min': 'float32',
+    'estimate_max': 'float32',
+    'rating_score': 'float64',
+    'rating_count': 'float64',
+    'location_lat': 'float64',
+    'location_lon': 'float64',
+    # menu items
+    'restaurant_id': 'category',
+    'restaurant_name': 'category',
+    'restaurant_slug': 'category',
+    'item_price': 'float32',
+    'item_currency': 'category',
+    'item_has_options': 'boolean',
+    'item_vat_percentage': 'float64',
+}
+
+NUMERIC_DTYPES = ('float32', 'float64')
+
+DEFAULT_CHUNK_ROWS = 100_000  # rows per chunk when a table is streamed rather than loaded whole
+
+
+def table_path(name, data_dir=DATA_DIR):
+    """Path of an output table, preferring an up-to-date Parquet copy over the CSV"""
+    csv_path = Path(data_dir) / f"{name}.csv"
+    parquet_path = Path(data_dir) / f"{name}.parquet"
+    if parquet_path.exists() and (not csv_path.exists() or
+                                  parquet_path.stat().st_mtime >= csv_path.stat().st_mtime):
+        return parquet_path
+    return csv_path
+
+
+def _apply_dtypes(df):
+    """Coerce loaded columns to their analysis dtypes"""
+    for column in df.columns:
+        dtype = COLUMN_DTYPES.get(column)
+        if dtype in NUMERIC_DTYPES:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(dtype)
+        elif dtype is not None and str(df[column].dtype) != dtype:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def _check_columns(name, columns):
+    fields = TABLE_FIELDS[name]
+    if columns is not None:
+        unknown = set(columns) - set(fields)
+        if unknown:
+            raise ValueError(f"Unknown {name} columns: {sorted(unknown)}")
+    return fields
+
+
+def _csv_options(fields, columns):
+    usecols = columns if columns is not None else (lambda column: column in fields)
+    parse_dtypes = {
+        column: dtype for column, dtype in COLUMN_DTYPES.items()
+        if dtype not in NUMERIC_DTYPES
+    }
+    parse_dtypes.update({column: 'str' for column in fields if column not in COLUMN_DTYPES})
+    return {'usecols': usecols, 'dtype': parse_dtypes}
+
+
+def load_table(name, columns=None, data_dir=DATA_DIR):
+    """
+    Load one of the scraper's output tables with compact dtypes.
+
+    Only the requested columns are read. Categorical, boolean and string
+    columns are typed while parsing; numeric columns are parsed natively and
+    then narrowed, with unparseable values becoming NaN.
+    """
+    fields = _check_columns(name, columns)
+    path = table_path(name, data_dir)
+    if path.suffix == '.parquet':
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_csv(path, **_csv_options(fields, columns))
+    return _apply_dtypes(df)
+
+
+def iter_table_chunks(name, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS, data_dir=DATA_DIR):
+    """
+    Yield an output table as DataFrames of at most chunk_rows rows, typed as
+    load_table types them, so a pass over the table holds one chunk at a time.
+    """
+    fields = _check_columns(name, columns)
+    path = table_path(name, data_dir)
+    if path.suffix == '.parquet':
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield _apply_dtypes(batch.to_pandas())
+    else:
+        with pd.read_csv(path, chunksize=chunk_rows, **_csv_options(fields, columns)) as reader:
+            for chunk in reader:
+                yield _apply_dtypes(chunk)
+
+
+def load_table_sql(database, name, columns=None):
+    """
+    Load an output table from a wolt_sqlite.WoltDatabase, with the same
+    columns and dtypes load_table gives the CSV.
+    """
+    fields = _check_columns(name, columns)
+    columns = list(columns) if columns is not None else list(fields)
+    rows = database.query(f"SELECT {', '.join(columns)} FROM {SQL_TABLES[name]}")
+    return _apply_dtypes(pd.DataFrame.from_records(rows, columns=columns))
+
+
+def load_restaurants(columns=None, data_dir=DATA_DIR):
+    return load_table('restaurants', columns=columns, data_dir=data_dir)
+
+
+def load_menu_items(columns=None, data_dir=DATA_DIR):
+    return load_table('menu_items', columns=columns, data_dir=data_dir)
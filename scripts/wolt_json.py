@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Wolt JSON Decoding
+Fast JSON parsing and field-selective extraction of venue and assortment payloads
+"""
+
+import json
+import hashlib
+from typing import List, Dict, Any, Iterator, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the standard library parser
+    orjson = None
+
+# Venue fields read by flatten_restaurant_data and the menu fetchers
+VENUE_FIELDS = (
+    'id', 'name', 'slug', 'address', 'online', 'delivers', 'franchise', 'product_line',
+    'short_description', 'tags', 'currency', 'price_range', 'delivery_price',
+    'delivery_price_int', 'estimate_range', 'rating', 'location',
+)
+
+# Item fields copied into menu rows; options are only checked for presence
+ITEM_FIELDS = ('id', 'name', 'description', 'price', 'tags', 'vat_percentage')
+
+
+def loads(data) -> Any:
+    """Decode a JSON document from bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> bytes:
+    """Encode a value as compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def iter_venues(data: Dict) -> Iterator[Dict]:
+    """Yield the 'venue-large' venues of a restaurants page, keeping only VENUE_FIELDS"""
+    for section in data.get('sections', []):
+        for item in section.get('items', []):
+            if item.get('template') == 'venue-large' and 'venue' in item:
+                venue = item['venue']
+                yield {field: venue[field] for field in VENUE_FIELDS if field in venue}
+
+
+def assortment_layout(data: Dict) -> Tuple[List[str], str]:
+    """
+    Item ids of an assortment in category order, with a fingerprint of its
+    category/item_id structure and of the checksum and price of every item
+    the assortment lists. Branches whose fingerprints match list the same
+    items in the same categories at the same prices, so their item details
+    are identical, and a venue whose fingerprint has not changed since its
+    last snapshot has not changed any listed item.
+    """
+    digest = hashlib.sha256()
+    item_ids = []
+    for category in data.get('categories', []):
+        ids = category.get('item_ids', [])
+        digest.update(f"{category.get('id', '')}:{','.join(map(str, ids))};".encode('utf-8'))
+        item_ids.extend(ids)
+    for item in data.get('items', []):
+        digest.update(f"{item.get('id', '')}={item.get('checksum', '')}/{item.get('price', '')};".encode('utf-8'))
+    return item_ids, digest.hexdigest()
+
+
+def slim_items(data: Dict) -> List[Dict]:
+    """Items of an assortment items response, keeping only ITEM_FIELDS and whether options exist"""
+    items = []
+    for item in data.get('items', []):
+        slim = {field: item[field] for field in ITEM_FIELDS if field in item}
+        slim['options'] = bool(item.get('options'))
+        items.append(slim)
+    return items
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Wolt Shared Menus
+Fingerprints of venue assortments, so chain branches with identical menus
+fetch their item details once
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Dict, Callable, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARED_MENUS = 64  # menus with details kept for reuse; the least recently used are dropped
+DEFAULT_PENDING_MENUS = 32  # details of menus seen once, kept in case a second branch follows soon
+DEFAULT_SEEN_FINGERPRINTS = 50_000  # fingerprints remembered from menus seen once, about 10 MB
+
+
+class SharedMenus:
+    """
+    Item details by assortment fingerprint, shared between branches.
+
+    Most menus belong to a single venue, and keeping all their details would
+    cost tens of kilobytes each for nothing. So the details of a fingerprint
+    seen for the first time are only held in a small pending LRU of
+    max_pending menus; the fingerprint itself goes into a larger LRU of
+    max_seen. When a second venue has the fingerprint, its pending details
+    (or the fetch still in flight) are promoted to the shared store of
+    max_menus, with no second fetch. If they have already left the pending
+    LRU, that venue fetches them again, and the result is kept. Any later
+    venue, including one asking while that fetch is still in flight, waits
+    for and reuses the kept result. A failed fetch is forgotten, so its
+    waiters and later branches fetch for themselves. Chains are usually
+    scraped city by city, so most branches meet while their menu is still
+    pending or shared.
+    """
+
+    def __init__(self, max_menus: int = DEFAULT_SHARED_MENUS, max_pending: int = DEFAULT_PENDING_MENUS,
+                 max_seen: int = DEFAULT_SEEN_FINGERPRINTS):
+        self.max_menus = max_menus
+        self.max_pending = max_pending
+        self.max_seen = max_seen
+        self.lock = threading.Lock()
+        self.seen: 'OrderedDict[str, None]' = OrderedDict()
+        self.pending: 'OrderedDict[str, Future]' = OrderedDict()
+        self.menus: 'OrderedDict[str, Future]' = OrderedDict()
+
+    @staticmethod
+    def _bound(entries: OrderedDict, size: int):
+        while len(entries) > size:
+            entries.popitem(last=False)
+
+    def get_or_fetch(self, fingerprint: str, fetch: Callable[[], List[Dict]]) -> Tuple[List[Dict], bool]:
+        """Item details for a fingerprint and whether they were reused, calling fetch unless they are kept"""
+        with self.lock:
+            owner = False
+            future = self.menus.get(fingerprint)
+            if future is not None:
+                self.menus.move_to_end(fingerprint)
+            else:
+                future = self.pending.pop(fingerprint, None)
+                if future is None:
+                    # Seen before but no longer pending: fetch again and share; never seen: fetch and hold
+                    owner = True
+                    future = Future()
+                    if fingerprint in self.seen:
+                        self.seen.move_to_end(fingerprint)
+                        store, size = self.menus, self.max_menus
+                    else:
+                        self.seen[fingerprint] = None
+                        self._bound(self.seen, self.max_seen)
+                        store, size = self.pending, self.max_pending
+                    store[fingerprint] = future
+                    self._bound(store, size)
+                else:
+                    self.menus[fingerprint] = future
+                    self._bound(self.menus, self.max_menus)
+
+        if owner:
+            try:
+                details = fetch()
+            except BaseException as e:
+                with self.lock:
+                    if self.pending.get(fingerprint) is future:
+                        del self.pending[fingerprint]
+                        self.seen.pop(fingerprint, None)
+                    elif self.menus.get(fingerprint) is future:
+                        del self.menus[fingerprint]
+                future.set_exception(e)
+                raise
+            future.set_result(details)
+            return details, False
+
+        try:
+            return future.result(), True
+        except Exception:
+            return fetch(), False
+
+    def __len__(self) -> int:
+        return len(self.menus)
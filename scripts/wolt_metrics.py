@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Wolt Scraper Telemetry
+Thread-safe counters, gauges and latency histograms, dumped as JSON or Prometheus text
+"""
+
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Histogram upper bounds in seconds, from JSON decoding up to slow requests
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+DEFAULT_EXPORT_INTERVAL = 15  # seconds between live Prometheus file updates
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    """Fixed-bucket histogram; counts[i] holds observations <= bounds[i], the last slot overflows"""
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating inside its bucket, clamped to the observed range"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = max(self.bounds[i - 1] if i > 0 else 0.0, self.min)
+                upper = min(self.bounds[i] if i < len(self.bounds) else self.max, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def snapshot(self) -> Dict:
+        cumulative = []
+        total = 0
+        for count in self.counts[:-1]:
+            total += count
+            cumulative.append(total)
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'buckets': dict(zip((str(bound) for bound in self.bounds), cumulative)),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """
+    Registry of labelled counters, gauges and histograms shared by the
+    transport and the scraper.
+
+    Every update takes one lock, which is negligible next to an HTTP request.
+    snapshot() gives a JSON-ready dump and prometheus_text() the Prometheus
+    text exposition format; start_export() rewrites a Prometheus file
+    periodically so a node_exporter textfile collector can scrape a live run.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.started = time.time()
+        self._export_stop: Optional[threading.Event] = None
+        self._export_thread: Optional[threading.Thread] = None
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self.lock:
+            self.gauges[(name, _labels(labels))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the duration of the block, including when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict:
+        """All metrics as plain data, for the JSON dump"""
+        with self.lock:
+            return {
+                'started': self.started,
+                'elapsed': round(time.time() - self.started, 3),
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                'gauges': [{'name': name, 'labels': dict(labels), 'value': value}
+                           for (name, labels), value in sorted(self.gauges.items())],
+                'histograms': [{'name': name, 'labels': dict(labels), **histogram.snapshot()}
+                               for (name, labels), histogram in sorted(self.histograms.items(),
+                                                                       key=lambda entry: entry[0])],
+            }
+
+    def prometheus_text(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self.lock:
+            for kind, series in (('counter', self.counters), ('gauge', self.gauges)):
+                for name in sorted({name for name, _ in series}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (series_name, labels), value in sorted(series.items()):
+                        if series_name == name:
+                            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (series_name, labels), histogram in sorted(self.histograms.items(), key=lambda entry: entry[0]):
+                    if series_name != name:
+                        continue
+                    total = 0
+                    for bound, count in zip(histogram.bounds, histogram.counts):
+                        total += count
+                        lines.append(f"{name}_bucket{_format_labels(labels, (('le', str(bound)),))} {total}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path: str):
+        _write_atomic(path, json.dumps(self.snapshot(), indent=2))
+
+    def write_prometheus(self, path: str):
+        _write_atomic(path, self.prometheus_text())
+
+    def start_export(self, path: str, interval: float = DEFAULT_EXPORT_INTERVAL):
+        """Rewrite a Prometheus text file every interval seconds until stop_export()"""
+        self._export_stop = threading.Event()
+
+        def export():
+            while not self._export_stop.wait(interval):
+                self.write_prometheus(path)
+
+        self._export_thread = threading.Thread(target=export, daemon=True)
+        self._export_thread.start()
+        logger.info(f"Exporting live metrics to {path} every {interval}s")
+
+    def stop_export(self):
+        if self._export_thread is not None:
+            self._export_stop.set()
+            self._export_thread.join()
+            self._export_thread = None
+
+    def summary(self) -> List[str]:
+        """One line per histogram and counter series, for the end-of-run log"""
+        with self.lock:
+            histograms = sorted(self.histograms.items(), key=lambda entry: entry[0])
+            lines = [
+                f"{name}{_format_labels(labels)}: n={h.count} total={h.sum:.2f}s "
+                f"p50={h.quantile(0.5):.3f}s p95={h.quantile(0.95):.3f}s"
+                for (name, labels), h in histograms
+            ]
+            lines += [f"{name}{_format_labels(labels)}: {value:.0f}"
+                      for (name, labels), value in sorted(self.counters.items())]
+        return lines
+
+
+def _write_atomic(path: str, text: str):
+    """Write via a temporary file so readers never see a partial file"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
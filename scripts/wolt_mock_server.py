@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Wolt Mock API Server
+Local stand-in for the venue listing and assortment endpoints, built from the
+recorded fixtures, with injectable latency, server errors and 429 throttling
+"""
+
+import csv
+import gzip
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from typing import List, Dict, Optional
+from urllib.parse import urlparse, parse_qs
+import logging
+
+from wolt_json import loads, dumps
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+DEFAULT_VENUES_PER_CITY = 30  # synthesized for cities without recorded venues, or a cap on recorded ones
+DEFAULT_RETRY_AFTER = 1  # seconds sent with injected 429s
+
+RESTAURANTS_PATH = "/v1/pages/restaurants"
+ASSORTMENT_PREFIX = "/consumer-api/consumer-assortment/v1/venues/slug/"
+
+
+def _venue_from_row(row: Dict) -> Dict:
+    """Rebuild an API venue object from a restaurants.csv row"""
+    def number(value, kind=float):
+        try:
+            return kind(float(value))
+        except (TypeError, ValueError):
+            return None
+
+    venue = {
+        'id': row['id'],
+        'name': row['name'],
+        'slug': row['slug'],
+        'address': row['address'],
+        'online': row['online'] == 'True',
+        'delivers': row['delivers'] == 'True',
+        'franchise': row['franchise'],
+        'product_line': row['product_line'],
+        'short_description': row['short_description'],
+        'tags': [tag for tag in row['tags'].split(', ') if tag],
+        'currency': row['currency'],
+        'price_range': number(row['price_range'], int),
+        'delivery_price': row['delivery_price'],
+        'delivery_price_int': number(row['delivery_price_int'], int),
+        'location': [number(row['location_lon']), number(row['location_lat'])],
+    }
+    if row['estimate_min']:
+        venue['estimate_range'] = f"{row['estimate_min']}-{row['estimate_max']}"
+    if row['rating_score']:
+        venue['rating'] = {'score': number(row['rating_score']), 'volume': number(row['rating_count'], int)}
+    return venue
+
+
+def _synthetic_venues(city: Dict, count: int) -> List[Dict]:
+    """Deterministic placeholder venues for a city"""
+    lon, lat = city['location']['coordinates'][:2]
+    venues = []
+    for i in range(count):
+        venue_id = hashlib.sha1(f"{city['slug']}/{i}".encode()).hexdigest()[:24]
+        venues.append({
+            'id': venue_id,
+            'name': f"{city.get('name', city['slug'])} Venue {i + 1}",
+            'slug': f"{city['slug']}-venue-{i + 1}",
+            'online': True,
+            'delivers': True,
+            'product_line': 'restaurant',
+            'tags': ['mock'],
+            'currency': city.get('currency', 'EUR'),
+            'price_range': i % 4 + 1,
+            'delivery_price_int': (i % 5) * 50,
+            'estimate_range': '20-30',
+            'rating': {'score': 7.0 + (i % 30) / 10, 'volume': 10 * (i + 1)},
+            'location': [lon + (i % 7 - 3) * 0.003, lat + (i % 5 - 2) * 0.003],
+        })
+    return venues
+
+
+class MockWoltData:
+    """
+    Responses served by the mock, built once from the fixtures.
+
+    A venue page request is answered with the venues of the city nearest to
+    the requested coordinates: the recorded venues from restaurants.csv when
+    that city has any (at most venues_per_city with cap_recorded), synthesized
+    ones otherwise. Every venue shares the recorded assortment from items.json.
+    """
+
+    def __init__(self, cities_file: str = "examples/cities.json", items_file: str = "examples/items.json",
+                 restaurants_file: str = "data/restaurants.csv", venues_per_city: int = DEFAULT_VENUES_PER_CITY,
+                 cap_recorded: bool = False):
+        with open(cities_file, 'rb') as f:
+            data = loads(f.read())
+        self.cities = data.get('results', data if isinstance(data, list) else [])
+        self.cities = [city for city in self.cities if len(city.get('location', {}).get('coordinates', [])) >= 2]
+
+        recorded = {}
+        if Path(restaurants_file).exists():
+            with open(restaurants_file, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    recorded.setdefault(row['city_slug'], []).append(_venue_from_row(row))
+        self.recorded = recorded
+        self.venues_per_city = venues_per_city
+        self.cap_recorded = cap_recorded
+        self.pages: Dict[str, bytes] = {}
+        self.lock = threading.Lock()
+
+        with open(items_file, 'rb') as f:
+            assortment = loads(f.read())
+        self.assortment = dumps({'categories': assortment.get('categories', [])})
+        self.items = {item['id']: item for item in assortment.get('items', [])}
+
+    def nearest_city(self, lat: float, lon: float) -> Dict:
+        def distance(city):
+            city_lon, city_lat = city['location']['coordinates'][:2]
+            return (city_lat - lat) ** 2 + ((city_lon - lon) * math.cos(math.radians(lat))) ** 2
+        return min(self.cities, key=distance)
+
+    def venue_page(self, lat: float, lon: float) -> bytes:
+        city = self.nearest_city(lat, lon)
+        with self.lock:
+            page = self.pages.get(city['slug'])
+            if page is None:
+                venues = self.recorded.get(city['slug']) or _synthetic_venues(city, self.venues_per_city)
+                if self.cap_recorded:
+                    venues = venues[:self.venues_per_city]
+                page = self.pages[city['slug']] = dumps({'sections': [{
+                    'name': 'restaurants-delivering-venues',
+                    'items': [{'template': 'venue-large', 'venue': venue} for venue in venues],
+                }]})
+        return page
+
+    def item_details(self, item_ids: List[str]) -> bytes:
+        return dumps({'items': [self.items[item_id] for item_id in item_ids if item_id in self.items]})
+
+
+class MockWoltServer:
+    """
+    Threaded HTTP server answering the scraper's three endpoints.
+
+    Each request sleeps latency seconds (plus up to jitter more), then fails
+    with a 500 at error_rate or a 429 with Retry-After at throttle_rate, using
+    a seeded RNG so runs are repeatable. Bodies are gzipped when the client
+    accepts it, like the real API.
+    """
+
+    def __init__(self, data: MockWoltData, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: float = DEFAULT_RETRY_AFTER, seed: int = 0):
+        self.data = data
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'errors': 0, 'throttled': 0}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _draw(self):
+        """Decide delay and injected failure for one request"""
+        with self.lock:
+            self.counts['requests'] += 1
+            delay = self.latency + self.random.uniform(0, self.jitter) if (self.latency or self.jitter) else 0
+            roll = self.random.random()
+            if roll < self.throttle_rate:
+                self.counts['throttled'] += 1
+                return delay, 429
+            if roll < self.throttle_rate + self.error_rate:
+                self.counts['errors'] += 1
+                return delay, 500
+        return delay, 200
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def respond(self, status: int, body: bytes = b'{}', headers: Dict[str, str] = None):
+                if 'gzip' in self.headers.get('accept-encoding', '') and status == 200:
+                    body = gzip.compress(body, compresslevel=1)
+                    headers = {**(headers or {}), 'content-encoding': 'gzip'}
+                self.send_response(status)
+                self.send_header('content-type', 'application/json')
+                self.send_header('content-length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def handle_request(self, body: Optional[bytes]):
+                delay, status = server._draw()
+                if delay:
+                    time.sleep(delay)
+                if status == 429:
+                    return self.respond(429, headers={'retry-after': str(server.retry_after)})
+                if status != 200:
+                    return self.respond(status)
+
+                url = urlparse(self.path)
+                if url.path == RESTAURANTS_PATH and body is None:
+                    query = parse_qs(url.query)
+                    try:
+                        lat, lon = float(query['lat'][0]), float(query['lon'][0])
+                    except (KeyError, ValueError):
+                        return self.respond(400)
+                    return self.respond(200, server.data.venue_page(lat, lon))
+                if url.path.startswith(ASSORTMENT_PREFIX):
+                    if url.path.endswith('/assortment') and body is None:
+                        return self.respond(200, server.data.assortment)
+                    if url.path.endswith('/assortment/items') and body is not None:
+                        return self.respond(200, server.data.item_details(loads(body).get('item_ids', [])))
+                self.respond(404)
+
+            def do_GET(self):
+                self.handle_request(None)
+
+            def do_POST(self):
+                length = int(self.headers.get('content-length', 0))
+                self.handle_request(self.rfile.read(length))
+
+        return Handler
+
+    def start(self) -> 'MockWoltServer':
+        """Serve from a background thread"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description="Serve a mock Wolt API from the recorded fixtures")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Up to this many extra random seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument('--retry-after', type=float, default=DEFAULT_RETRY_AFTER,
+                        help=f"Retry-After seconds sent with 429s (default: {DEFAULT_RETRY_AFTER})")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cities-file', default="examples/cities.json")
+    parser.add_argument('--items-file', default="examples/items.json")
+    parser.add_argument('--venues-per-city', type=int, default=DEFAULT_VENUES_PER_CITY,
+                        help=f"Venues synthesized per city without recorded ones (default: {DEFAULT_VENUES_PER_CITY})")
+    parser.add_argument('--cap-recorded', action='store_true',
+                        help="Also cap recorded cities at --venues-per-city venues")
+    parser.add_argument('--restaurants-file', default="data/restaurants.csv",
+                        help="Recorded venues to serve, by city_slug (default: data/restaurants.csv)")
+    return parser.parse_args(argv)
+
+
+def main():
+    """Main entry point"""
+    args = parse_args()
+    data = MockWoltData(args.cities_file, args.items_file, args.restaurants_file,
+                        venues_per_city=args.venues_per_city, cap_recorded=args.cap_recorded)
+    server = MockWoltServer(data, host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+                            error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                            retry_after=args.retry_after, seed=args.seed)
+    logger.info(f"Mock Wolt API on {server.base_url} (scrape with --base-url {server.base_url})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        logger.info(f"Served {server.counts}")
+
+
+if __name__ == "__main__":
+    main()
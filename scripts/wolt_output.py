@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Wolt Scraper Output
+Sinks that receive venues and menus from the scraping engines
+"""
+
+import csv
+from collections import defaultdict
+from pathlib import Path
+from typing import List, Dict, Callable, Tuple, Iterable, Iterator, Any, Optional
+import logging
+
+from wolt_sketches import PriceSketch
+
+logger = logging.getLogger(__name__)
+
+# Columns written by WoltScraper.flatten_restaurant_data
+RESTAURANT_FIELDS = [
+    'id', 'name', 'slug', 'city', 'city_slug', 'country', 'address', 'online', 'delivers',
+    'franchise', 'product_line', 'short_description', 'tags', 'currency', 'price_range',
+    'delivery_price', 'delivery_price_int', 'estimate_min', 'estimate_max',
+    'rating_score', 'rating_count', 'location_lat', 'location_lon',
+]
+
+# Columns of the menu item rows (wolt_records.MenuItem.as_row)
+MENU_ITEM_FIELDS = [
+    'restaurant_id', 'restaurant_name', 'restaurant_slug', 'city', 'item_id', 'item_name',
+    'item_description', 'item_price', 'item_currency', 'item_tags', 'item_has_options',
+    'item_vat_percentage',
+]
+
+# restaurants_with_menu.csv has always been written with its columns sorted
+COMBINED_FIELDS = sorted(set(RESTAURANT_FIELDS) | set(MENU_ITEM_FIELDS))
+
+DEFAULT_BUFFER_ROWS = 5000  # rows held per file before flushing to disk
+
+
+def group_by_restaurant(menu_items: Iterable) -> Dict[Any, List]:
+    """Index menu item records by restaurant_id in a single pass"""
+    items_by_restaurant = defaultdict(list)
+    for item in menu_items:
+        items_by_restaurant[item.restaurant_id].append(item)
+    return items_by_restaurant
+
+
+def iter_combined_rows(flat_restaurants: Iterable[Dict], items_by_restaurant: Dict[Any, List]) -> Iterator[Dict]:
+    """
+    Hash-join flattened restaurants with their menu items.
+
+    Yields one row per menu item, or the bare restaurant row when it has no
+    items, in restaurant order.
+    """
+    for restaurant_flat in flat_restaurants:
+        restaurant_menu_items = items_by_restaurant.get(restaurant_flat.get('id'))
+        if restaurant_menu_items:
+            for menu_item in restaurant_menu_items:
+                yield {**restaurant_flat, **menu_item.as_row()}
+        else:
+            # Restaurant with no menu items
+            yield restaurant_flat
+
+
+class MemorySink:
+    """
+    Collects venues and menus in memory.
+
+    Engines report results tagged with their city and restaurant positions, so
+    the async engine can deliver them in completion order while results() still
+    returns them in input order. Menus are also added to the price sketch, if
+    one is given.
+    """
+
+    def __init__(self, sketch: Optional[PriceSketch] = None):
+        self.city_restaurants: Dict[int, List[Dict]] = {}
+        self.menus: Dict[Tuple[int, int], List] = {}
+        self.sketch = sketch
+
+    @property
+    def restaurant_count(self) -> int:
+        return sum(len(restaurants) for restaurants in self.city_restaurants.values())
+
+    @property
+    def menu_item_count(self) -> int:
+        return sum(len(items) for items in self.menus.values())
+
+    def add_restaurants(self, city_index: int, restaurants: List[Dict]):
+        self.city_restaurants[city_index] = restaurants
+
+    def add_menu(self, city_index: int, restaurant_index: int, restaurant: Dict, items: List):
+        self.menus[(city_index, restaurant_index)] = items
+        if self.sketch is not None:
+            self.sketch.add_items(items)
+
+    def results(self) -> Tuple[List[Dict], List]:
+        """Return (restaurants, menu item records) in input order"""
+        restaurants = [r for ci in sorted(self.city_restaurants) for r in self.city_restaurants[ci]]
+        menu_items = [item for key in sorted(self.menus) for item in self.menus[key]]
+        return restaurants, menu_items
+
+    def close(self):
+        pass
+
+
+class _BufferedCsv:
+    """A CSV file whose rows are flushed every buffer_rows rows"""
+
+    def __init__(self, path: Path, fieldnames: List[str], buffer_rows: int):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+        self.writer.writeheader()
+        self.buffer: List[Dict] = []
+        self.buffer_rows = buffer_rows
+        self.rows = 0
+
+    def write(self, rows: List[Dict]):
+        self.buffer.extend(rows)
+        self.rows += len(rows)
+        if len(self.buffer) >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        self.writer.writerows(self.buffer)
+        self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class StreamingCsvSink:
+    """
+    Writes restaurants.csv, menu_items.csv and restaurants_with_menu.csv while
+    the scrape runs.
+
+    Rows go to disk as each fetch completes, with at most buffer_rows rows held
+    per file, so memory stays flat regardless of how much is scraped. With the
+    async engine, rows appear in completion order rather than input order.
+    """
+
+    def __init__(self, output_dir: str, flatten: Callable[[Dict], Dict], buffer_rows: int = DEFAULT_BUFFER_ROWS,
+                 sketch: Optional[PriceSketch] = None):
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        self.flatten = flatten
+        self.sketch = sketch
+        self.restaurants_csv = _BufferedCsv(Path(output_dir) / "restaurants.csv", RESTAURANT_FIELDS, buffer_rows)
+        self.menu_csv = _BufferedCsv(Path(output_dir) / "menu_items.csv", MENU_ITEM_FIELDS, buffer_rows)
+        self.combined_csv = _BufferedCsv(Path(output_dir) / "restaurants_with_menu.csv", COMBINED_FIELDS, buffer_rows)
+        logger.info(f"Streaming output to {output_dir}")
+
+    @property
+    def restaurant_count(self) -> int:
+        return self.restaurants_csv.rows
+
+    @property
+    def menu_item_count(self) -> int:
+        return self.menu_csv.rows
+
+    def add_restaurants(self, city_index: int, restaurants: List[Dict]):
+        self.restaurants_csv.write([self.flatten(r) for r in restaurants])
+
+    def add_menu(self, city_index: int, restaurant_index: int, restaurant: Dict, items: List):
+        self.menu_csv.write([item.as_row() for item in items])
+        if self.sketch is not None:
+            self.sketch.add_items(items)
+        self.combined_csv.write(list(iter_combined_rows([self.flatten(restaurant)], {restaurant.get('id'): items})))
+
+    def results(self) -> Tuple[List[Dict], List]:
+        """Streamed rows are on disk, not in memory"""
+        return [], []
+
+    def close(self):
+        for output in (self.restaurants_csv, self.menu_csv, self.combined_csv):
+            output.close()
+        logger.info(f"Streamed {self.restaurant_count} restaurants and {self.menu_item_count} menu items")
+
+
+def _append_csv(path: Path, fieldnames: List[str], rows: Iterable[Dict]):
+    """Append rows to a CSV file, writing the header first when the file is new"""
+    new = not path.exists()
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        if new:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+def merge_into_csv(output_dir: str, flat_restaurants: List[Dict], menu_items: List):
+    """
+    Add re-driven results to the CSV files of an earlier run.
+
+    Restaurants of recovered cities and all recovered menu items are appended
+    to restaurants.csv and menu_items.csv. restaurants_with_menu.csv is
+    rewritten in one streaming pass: the bare row of a restaurant whose menu
+    was recovered is replaced by its item rows, then the recovered cities'
+    restaurants are joined and appended.
+    """
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    _append_csv(output / "restaurants.csv", RESTAURANT_FIELDS, flat_restaurants)
+    _append_csv(output / "menu_items.csv", MENU_ITEM_FIELDS, (item.as_row() for item in menu_items))
+
+    items_by_restaurant = group_by_restaurant(menu_items)
+    combined_file = output / "restaurants_with_menu.csv"
+    tmp_file = output / "restaurants_with_menu.csv.tmp"
+    with open(tmp_file, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.DictWriter(out, fieldnames=COMBINED_FIELDS)
+        writer.writeheader()
+        if combined_file.exists():
+            with open(combined_file, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    recovered = items_by_restaurant.get(row['id']) if not row['item_id'] else None
+                    if recovered:
+                        restaurant_flat = {field: row[field] for field in RESTAURANT_FIELDS}
+                        writer.writerows(iter_combined_rows([restaurant_flat], {row['id']: recovered}))
+                    else:
+                        writer.writerow(row)
+        writer.writerows(iter_combined_rows(flat_restaurants, items_by_restaurant))
+    tmp_file.replace(combined_file)
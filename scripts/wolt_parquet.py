@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Wolt Columnar Export
+Converts the scraper's CSV output to typed, dictionary-encoded Parquet files
+"""
+
+from pathlib import Path
+from typing import Dict
+import logging
+
+from wolt_output import RESTAURANT_FIELDS, MENU_ITEM_FIELDS, COMBINED_FIELDS
+
+logger = logging.getLogger(__name__)
+
+TABLES = ('restaurants', 'menu_items', 'restaurants_with_menu')
+
+# Column types by name; anything not listed is a plain string
+# Repeated values are dictionary encoded, prices and ratings are typed numerics
+_DICT = 'dictionary'
+COLUMN_TYPES = {
+    # restaurants
+    'slug': _DICT,
+    'city': _DICT,
+    'city_slug': _DICT,
+    'country': _DICT,
+    'online': 'bool_',
+    'delivers': 'bool_',
+    'product_line': _DICT,
+    'currency': _DICT,
+    'price_range': 'int8',
+    'delivery_price_int': 'int32',
+    'estimate_min': 'int16',
+    'estimate_max': 'int16',
+    'rating_score': 'float64',
+    'rating_count': 'int32',
+    'location_lat': 'float64',
+    'location_lon': 'float64',
+    # menu items
+    'restaurant_id': _DICT,
+    'restaurant_name': _DICT,
+    'restaurant_slug': _DICT,
+    'item_price': 'int64',
+    'item_currency': _DICT,
+    'item_has_options': 'bool_',
+    'item_vat_percentage': 'float64',
+}
+
+TABLE_FIELDS = {
+    'restaurants': RESTAURANT_FIELDS,
+    'menu_items': MENU_ITEM_FIELDS,
+    'restaurants_with_menu': COMBINED_FIELDS,
+}
+
+
+def _arrow_type(pa, kind: str):
+    if kind == _DICT:
+        return pa.dictionary(pa.int32(), pa.string())
+    return getattr(pa, kind)()
+
+
+def arrow_schema(table: str):
+    """Arrow schema for one of the scraper's output tables"""
+    import pyarrow as pa
+
+    return pa.schema([
+        (name, _arrow_type(pa, COLUMN_TYPES.get(name, 'string')))
+        for name in TABLE_FIELDS[table]
+    ])
+
+
+def csv_to_parquet(csv_path: Path, parquet_path: Path, table: str) -> int:
+    """
+    Stream a CSV file into a Parquet file with the table's typed schema.
+
+    The CSV is read in record batches, so memory stays bounded however large
+    the file is. Returns the number of rows written.
+    """
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(table)
+    dictionary_columns = [name for name in schema.names if COLUMN_TYPES.get(name) == _DICT]
+    convert_options = pacsv.ConvertOptions(
+        column_types={field.name: field.type for field in schema},
+        include_columns=schema.names,
+        include_missing_columns=True,
+    )
+
+    rows = 0
+    reader = pacsv.open_csv(csv_path, convert_options=convert_options)
+    with pq.ParquetWriter(parquet_path, schema, compression='zstd', use_dictionary=dictionary_columns) as writer:
+        for batch in reader:
+            # Pin column order and types to the file schema
+            writer.write_batch(batch.select(schema.names).cast(schema))
+            rows += batch.num_rows
+    return rows
+
+
+def export_parquet(output_dir: str = "data") -> Dict[str, int]:
+    """Write a .parquet file next to each of the scraper's CSV outputs"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+
+    written = {}
+    for table in TABLES:
+        csv_path = Path(output_dir) / f"{table}.csv"
+        if not csv_path.exists():
+            continue
+        parquet_path = csv_path.with_suffix('.parquet')
+        written[table] = csv_to_parquet(csv_path, parquet_path, table)
+        logger.info(f"Saved {written[table]} rows to {parquet_path}")
+    return written
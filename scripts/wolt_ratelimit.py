@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Wolt Rate Limiting
+Adaptive token buckets, one per API endpoint family
+"""
+
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Endpoint families
+VENUES = 'venues'
+ASSORTMENT = 'assortment'
+ASSORTMENT_ITEMS = 'assortment_items'
+
+# Rate defaults (requests per second, per endpoint family)
+DEFAULT_RATE = 1.0
+MIN_RATE = 0.2
+MAX_RATE = 10.0
+RATE_INCREASE = 0.1  # added after every healthy response
+BACKOFF_FACTOR = 0.5  # rate multiplier after a 429/5xx
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (seconds or HTTP date) into seconds from now"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket with an adjustable refill rate.
+
+    Healthy responses raise the rate additively; throttled responses cut it
+    multiplicatively and can pause the bucket until a Retry-After deadline.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, min_rate: float = MIN_RATE, max_rate: float = MAX_RATE,
+                 increase: float = RATE_INCREASE, backoff: float = BACKOFF_FACTOR):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.backoff = backoff
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def capacity(self) -> float:
+        # Allow a one-second burst at the current rate, never less than one request
+        return max(1.0, self.rate)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.blocked_until:
+                    self._refill(now)
+                    if self.tokens >= 1.0:
+                        self.tokens -= 1.0
+                        return
+                    wait = (1.0 - self.tokens) / self.rate
+                else:
+                    wait = self.blocked_until - now
+            time.sleep(wait)
+
+    def on_success(self):
+        """Raise the rate after a healthy response"""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """Back off after a 429/5xx response, honouring Retry-After when given"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * self.backoff)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+
+class RateLimiter:
+    """Adaptive rate limiter holding one token bucket per endpoint family"""
+
+    def __init__(self, rate: float = DEFAULT_RATE, max_rate: float = MAX_RATE, min_rate: float = MIN_RATE):
+        self.rate = rate
+        self.max_rate = max(rate, max_rate)
+        self.min_rate = min(rate, min_rate)
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, family: str) -> TokenBucket:
+        """Return the bucket for an endpoint family, creating it on first use"""
+        with self.lock:
+            if family not in self.buckets:
+                self.buckets[family] = TokenBucket(self.rate, min_rate=self.min_rate, max_rate=self.max_rate)
+            return self.buckets[family]
+
+    def acquire(self, family: str):
+        self.bucket(family).acquire()
+
+    def on_success(self, family: str):
+        self.bucket(family).on_success()
+
+    def on_throttle(self, family: str, retry_after: Optional[float] = None):
+        bucket = self.bucket(family)
+        bucket.on_throttle(retry_after)
+        logger.warning(f"Throttled on {family}: rate lowered to {bucket.rate:.2f} req/s"
+                       + (f", pausing {retry_after:.1f}s" if retry_after else ""))
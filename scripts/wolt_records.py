@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Wolt Scraper Records
+Compact in-memory menu item records, converted to output rows only when written
+"""
+
+from typing import List, Dict, Iterable, Iterator
+
+from wolt_output import MENU_ITEM_FIELDS
+
+# Per-restaurant columns, stored once per menu and shared by its items
+RESTAURANT_COLUMNS = ('restaurant_id', 'restaurant_name', 'restaurant_slug', 'city', 'item_currency')
+
+# Per-item columns, stored on each record
+ITEM_COLUMNS = tuple(field for field in MENU_ITEM_FIELDS if field not in RESTAURANT_COLUMNS)
+
+
+class MenuOwner:
+    """The restaurant-level values repeated on every menu row of one restaurant"""
+
+    __slots__ = RESTAURANT_COLUMNS
+
+    def __init__(self, restaurant_id, restaurant_name, restaurant_slug, city, item_currency):
+        self.restaurant_id = restaurant_id
+        self.restaurant_name = restaurant_name
+        self.restaurant_slug = restaurant_slug
+        self.city = city
+        self.item_currency = item_currency
+
+    @classmethod
+    def for_restaurant(cls, restaurant: Dict) -> 'MenuOwner':
+        slug = restaurant.get('slug')
+        return cls(restaurant.get('id'), restaurant.get('name', slug), slug,
+                   restaurant.get('city'), restaurant.get('currency', 'AZN'))
+
+
+class MenuItem:
+    """
+    One menu item: a slotted record holding the item's own values and a
+    reference to its shared MenuOwner, instead of a 12-key dict per item.
+    """
+
+    __slots__ = ('owner',) + ITEM_COLUMNS
+
+    def __init__(self, owner: MenuOwner, item_id, item_name, item_description, item_price,
+                 item_tags, item_has_options, item_vat_percentage):
+        self.owner = owner
+        self.item_id = item_id
+        self.item_name = item_name
+        self.item_description = item_description
+        self.item_price = item_price
+        self.item_tags = item_tags
+        self.item_has_options = item_has_options
+        self.item_vat_percentage = item_vat_percentage
+
+    @property
+    def restaurant_id(self):
+        return self.owner.restaurant_id
+
+    def as_row(self) -> Dict:
+        """The item's menu_items.csv row"""
+        owner = self.owner
+        return {
+            'restaurant_id': owner.restaurant_id,
+            'restaurant_name': owner.restaurant_name,
+            'restaurant_slug': owner.restaurant_slug,
+            'city': owner.city,
+            'item_id': self.item_id,
+            'item_name': self.item_name,
+            'item_description': self.item_description,
+            'item_price': self.item_price,
+            'item_currency': owner.item_currency,
+            'item_tags': self.item_tags,
+            'item_has_options': self.item_has_options,
+            'item_vat_percentage': self.item_vat_percentage,
+        }
+
+    @classmethod
+    def from_row(cls, owner: MenuOwner, row: Dict) -> 'MenuItem':
+        return cls(owner, *(row.get(column) for column in ITEM_COLUMNS))
+
+
+def menu_rows(items: Iterable[MenuItem]) -> Iterator[Dict]:
+    """Convert menu item records to output rows"""
+    for item in items:
+        yield item.as_row()
+
+
+def menu_from_rows(restaurant: Dict, rows: List[Dict]) -> List[MenuItem]:
+    """Rebuild a restaurant's menu records from saved rows"""
+    owner = MenuOwner.for_restaurant(restaurant)
+    return [MenuItem.from_row(owner, row) for row in rows]
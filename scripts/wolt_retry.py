@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Wolt Retry Queue
+Deferred retries of failed city and menu fetches, with per-error-class backoff
+and a persisted dead-letter file for fetches that keep failing
+"""
+
+import os
+import json
+import time
+import heapq
+import random
+import threading
+from itertools import count
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, NamedTuple, Tuple
+import logging
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DEAD_LETTER_FILE = "dead_letter.jsonl"
+
+
+class RetryPolicy(NamedTuple):
+    """How often and how patiently one class of error is retried"""
+    max_retries: int
+    base_delay: float  # seconds before the first retry, doubled after each failure
+    max_delay: float
+
+
+# Error class -> policy. Throttling and outages get long, patient backoff;
+# a 4xx other than 429, or a response missing from a replay archive, will
+# not change by asking again and goes straight to the dead-letter file.
+RETRY_POLICIES = {
+    'throttled': RetryPolicy(6, 10.0, 300.0),
+    'server': RetryPolicy(4, 5.0, 120.0),
+    'timeout': RetryPolicy(4, 5.0, 120.0),
+    'connection': RetryPolicy(5, 5.0, 180.0),
+    'decode': RetryPolicy(2, 2.0, 30.0),
+    'client': RetryPolicy(0, 0.0, 0.0),
+    'missing': RetryPolicy(0, 0.0, 0.0),
+    'other': RetryPolicy(2, 2.0, 30.0),
+}
+
+
+def status_error_class(status: int) -> str:
+    """Classify an HTTP error status into a RETRY_POLICIES key"""
+    if status == 429:
+        return 'throttled'
+    return 'server' if status >= 500 else 'client'
+
+
+def error_class(error: BaseException) -> str:
+    """Classify a fetch error into a RETRY_POLICIES key"""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return status_error_class(error.response.status_code)
+    # ConnectTimeout is both a Timeout and a ConnectionError
+    if isinstance(error, requests.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.ConnectionError):
+        return 'connection'
+    if isinstance(error, ValueError):
+        return 'decode'
+    if isinstance(error, LookupError):
+        return 'missing'
+    return 'other'
+
+
+class RetryTask:
+    """One failed fetch: what it was for, where its result goes, and how it has failed so far"""
+
+    __slots__ = ('kind', 'item', 'positions', 'error_class', 'error', 'attempts', 'due')
+
+    def __init__(self, kind: str, item: Dict, positions: Tuple[int, ...], error_class: str, error: str,
+                 attempts: int = 0, due: float = 0.0):
+        self.kind = kind
+        self.item = item
+        self.positions = positions
+        self.error_class = error_class
+        self.error = error
+        self.attempts = attempts
+        self.due = due
+
+    def as_entry(self) -> Dict[str, Any]:
+        """The task's dead-letter record"""
+        return {
+            'kind': self.kind, 'item': self.item, 'error_class': self.error_class,
+            'error': self.error, 'attempts': self.attempts, 'failed_at': time.time(),
+        }
+
+
+class RetryQueue:
+    """
+    Failed fetches waiting to be retried, one queue per error class.
+
+    Engines add failures as they happen and move on; drain() then retries them
+    in due order, each after an exponentially growing delay with equal jitter
+    (half fixed, half random) so retries of a burst of failures spread out.
+    Keeping error classes apart means a long throttling backoff never holds
+    up a quick retry of a timeout. A task that fails more often than its
+    class allows, or whose error is not worth retrying, is moved to dead.
+    """
+
+    def __init__(self, policies: Dict[str, RetryPolicy] = None, seed: Optional[int] = None):
+        self.policies = policies or RETRY_POLICIES
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.queues: Dict[str, List[Tuple[float, int, RetryTask]]] = {}
+        self.sequence = count()
+        self.dead: List[RetryTask] = []
+
+    def __len__(self) -> int:
+        with self.lock:
+            return sum(len(queue) for queue in self.queues.values())
+
+    def backoff(self, policy: RetryPolicy, attempts: int) -> float:
+        """Delay before retry number attempts (1-based)"""
+        delay = min(policy.max_delay, policy.base_delay * 2 ** (attempts - 1))
+        return delay / 2 + self.random.uniform(0, delay / 2)
+
+    def add(self, kind: str, item: Dict, positions: Tuple[int, ...], error: BaseException,
+            attempts: int = 1) -> bool:
+        """Queue a fetch that has failed attempts times; False when it went to dead instead"""
+        cls = error_class(error)
+        policy = self.policies.get(cls, self.policies['other'])
+        task = RetryTask(kind, item, positions, cls, f"{type(error).__name__}: {error}", attempts)
+        with self.lock:
+            if attempts > policy.max_retries:
+                self.dead.append(task)
+                return False
+            task.due = time.monotonic() + self.backoff(policy, attempts)
+            heapq.heappush(self.queues.setdefault(cls, []), (task.due, next(self.sequence), task))
+        return True
+
+    def call(self, fetch: Callable[[], Any], max_retries: int,
+             on_retry: Optional[Callable[[str, int], None]] = None) -> Any:
+        """
+        Call fetch, retrying it in place after its error class's backoff, at
+        most max_retries times and never more than the class allows. For one
+        part of a larger fetch, so a failed part is retried without the
+        parts that succeeded; the last error is raised for the caller to queue.
+        on_retry(error_class, attempts) is called before each retry.
+        """
+        attempts = 0
+        while True:
+            try:
+                return fetch()
+            except Exception as e:
+                attempts += 1
+                cls = error_class(e)
+                policy = self.policies.get(cls, self.policies['other'])
+                if attempts > min(max_retries, policy.max_retries):
+                    raise
+                if on_retry is not None:
+                    on_retry(cls, attempts)
+                with self.lock:
+                    delay = self.backoff(policy, attempts)
+                time.sleep(delay)
+
+    def requeue(self, kind: str, item: Dict, positions: Tuple[int, ...], error_class: str, error: str):
+        """Queue a dead-lettered fetch for an immediate retry with a fresh budget"""
+        task = RetryTask(kind, item, positions, error_class, error, attempts=0, due=time.monotonic())
+        with self.lock:
+            heapq.heappush(self.queues.setdefault(error_class, []), (task.due, next(self.sequence), task))
+
+    def pop(self) -> Optional[RetryTask]:
+        """The task due soonest across all classes, after waiting until it is due"""
+        with self.lock:
+            heads = [queue[0] for queue in self.queues.values() if queue]
+            if not heads:
+                return None
+            due, _, task = min(heads)
+            heapq.heappop(self.queues[task.error_class])
+        wait = due - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        return task
+
+    def drain(self, handler: Callable[[RetryTask], None], on_dead: Callable[[RetryTask], None]):
+        """
+        Retry queued tasks until none are left. handler raises to fail a task,
+        which is queued again or, out of retries, passed to on_dead. Tasks the
+        handler queues itself are drained too.
+        """
+        for task in self.dead:
+            on_dead(task)
+        handled_dead = len(self.dead)
+
+        while True:
+            task = self.pop()
+            if task is None:
+                break
+            try:
+                handler(task)
+            except Exception as e:
+                self.add(task.kind, task.item, task.positions, e, attempts=task.attempts + 1)
+            for dead in self.dead[handled_dead:]:
+                on_dead(dead)
+            handled_dead = len(self.dead)
+
+    def remaining(self) -> List[RetryTask]:
+        """Dead tasks plus any still queued, e.g. when a run is interrupted before draining"""
+        with self.lock:
+            queued = sorted((entry for queue in self.queues.values() for entry in queue), key=lambda entry: entry[:2])
+            return self.dead + [task for _, _, task in queued]
+
+
+class DeadLetterFile:
+    """Fetches that ran out of retries, as JSON lines, rewritten whole at the end of each run or re-drive"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    def load(self) -> List[Dict[str, Any]]:
+        if not self.path.exists():
+            return []
+        with open(self.path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def write(self, tasks: List[RetryTask]):
+        """Replace the file with tasks, removing it when there are none"""
+        if not tasks:
+            if self.path.exists():
+                self.path.unlink()
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for task in tasks:
+                f.write(json.dumps(task.as_entry(), ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+        logger.warning(f"{len(tasks)} fetches still failing, written to {self.path}")
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Wolt Sharded Scraping
+Splits the city list into shards on a shared SQLite work queue, runs worker
+processes (on one machine or several sharing a directory) that claim and
+scrape shards, and merges their outputs without duplicates
+"""
+
+import os
+import csv
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+from pathlib import Path
+from typing import List, Dict, Optional
+import logging
+
+from wolt_output import RESTAURANT_FIELDS, MENU_ITEM_FIELDS, COMBINED_FIELDS
+from wolt_sketches import PriceSketch, PRICE_SKETCH_FILE
+from wolt_retry import DEAD_LETTER_FILE
+from scrape_wolt_restaurants import WoltScraper, ENGINES, DEFAULT_CONCURRENCY, BASE_URL, ITEM_BATCH_SIZE
+from wolt_ratelimit import DEFAULT_RATE, MAX_RATE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD_SIZE = 4  # cities per shard
+DEFAULT_LEASE = 600  # seconds a claim stays valid without a heartbeat
+MAX_ATTEMPTS = 3  # claims per shard before it is left as failed
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    cities TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    heartbeat REAL,
+    error TEXT
+);
+"""
+
+
+def worker_id() -> str:
+    """Identify a worker across machines sharing the run directory"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class ShardQueue:
+    """
+    Work queue of city shards in a SQLite file inside the run directory.
+
+    Claims take a write lock (BEGIN IMMEDIATE), so concurrent workers never
+    receive the same shard. A running shard whose heartbeat is older than the
+    lease is handed to the next worker, which resumes from the shard's
+    checkpoint. SQLite locking needs a filesystem with working POSIX locks;
+    multi-machine runs should share the directory over such a filesystem.
+    """
+
+    def __init__(self, run_dir: str, lease: float = DEFAULT_LEASE):
+        self.run_dir = Path(run_dir)
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        self.lease = lease
+        self.conn = sqlite3.connect(str(self.run_dir / "queue.sqlite"), timeout=60, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def shard_dir(self, shard_id: int) -> Path:
+        return self.run_dir / "shards" / f"{shard_id:05d}"
+
+    def plan(self, cities: List[Dict], shard_size: int = DEFAULT_SHARD_SIZE) -> int:
+        """Split cities into shards; refuses to overwrite an existing plan"""
+        with self.lock:
+            if self.conn.execute("SELECT COUNT(*) FROM shards").fetchone()[0]:
+                raise RuntimeError(f"{self.run_dir} already has a shard plan")
+            shards = [cities[i:i + shard_size] for i in range(0, len(cities), shard_size)]
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany("INSERT INTO shards (id, cities) VALUES (?, ?)",
+                                  [(i, json.dumps(shard)) for i, shard in enumerate(shards, 1)])
+            self.conn.execute("COMMIT")
+        return len(shards)
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """Claim the next pending (or abandoned) shard, or None when nothing is left"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            # Shards that used up their attempts (errors or abandoned claims) are given up on
+            self.conn.execute(
+                "UPDATE shards SET status = 'failed' WHERE attempts >= ? AND "
+                "(status = 'pending' OR (status = 'running' AND heartbeat < ?))",
+                (MAX_ATTEMPTS, now - self.lease)
+            )
+            row = self.conn.execute(
+                "SELECT id, cities FROM shards WHERE "
+                "status = 'pending' OR (status = 'running' AND heartbeat < ?) ORDER BY id LIMIT 1",
+                (now - self.lease,)
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute(
+                "UPDATE shards SET status = 'running', worker = ?, heartbeat = ?, attempts = attempts + 1 "
+                "WHERE id = ?", (worker, now, row[0])
+            )
+            self.conn.execute("COMMIT")
+        return {'id': row[0], 'cities': json.loads(row[1])}
+
+    def heartbeat(self, shard_id: int, worker: str):
+        with self.lock:
+            self.conn.execute("UPDATE shards SET heartbeat = ? WHERE id = ? AND worker = ?",
+                              (time.time(), shard_id, worker))
+
+    def finish(self, shard_id: int, worker: str, error: Optional[str] = None):
+        """Mark a shard done, or return it to the queue after an error"""
+        with self.lock:
+            self.conn.execute("UPDATE shards SET status = ?, error = ? WHERE id = ? AND worker = ?",
+                              ('pending' if error else 'done', error, shard_id, worker))
+
+    def status(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall())
+
+    def done_shards(self) -> List[int]:
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT id FROM shards WHERE status = 'done' ORDER BY id")]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def worker_options(scraper_options: Dict, processes: int) -> Dict:
+    """
+    Scraper options for one of processes workers. Every worker has its own
+    rate limiter, so the rate and its ceiling are split between them to keep
+    their sum at what was asked for.
+    """
+    options = dict(scraper_options)
+    for name in ('rate', 'max_rate'):
+        if name in options:
+            options[name] = options[name] / processes
+    return options
+
+
+def run_worker(run_dir: str, scraper_options: Dict = None, lease: float = DEFAULT_LEASE) -> int:
+    """Claim and scrape shards until the queue is empty; returns the number of shards done"""
+    queue = ShardQueue(run_dir, lease=lease)
+    worker = worker_id()
+    completed = 0
+
+    while True:
+        shard = queue.claim(worker)
+        if shard is None:
+            break
+
+        shard_dir = queue.shard_dir(shard['id'])
+        logger.info(f"[{worker}] Scraping shard {shard['id']} ({len(shard['cities'])} cities)")
+
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(lease / 3):
+                queue.heartbeat(shard['id'], worker)
+
+        heartbeat = threading.Thread(target=beat, daemon=True)
+        heartbeat.start()
+
+        # Streamed output plus a shard checkpoint: a re-claimed shard resumes
+        # from the checkpoint and rewrites its output files in full
+        scraper = WoltScraper(stream=True, output_dir=str(shard_dir / "output"),
+                              checkpoint_path=str(shard_dir / "checkpoint.sqlite"), resume=True,
+                              metrics_file=str(shard_dir / "metrics.json"),
+                              **(scraper_options or {}))
+        try:
+            scraper.scrape_all(cities=shard['cities'])
+            queue.finish(shard['id'], worker)
+            completed += 1
+        except Exception as e:
+            logger.error(f"[{worker}] Shard {shard['id']} failed: {e}", exc_info=True)
+            queue.finish(shard['id'], worker, error=str(e))
+        finally:
+            stop.set()
+            heartbeat.join()
+            scraper.close()
+
+    queue.close()
+    logger.info(f"[{worker}] No shards left, completed {completed}")
+    return completed
+
+
+def _read_rows(path: Path):
+    if not path.exists():
+        return
+    with open(path, newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+
+def merge_shards(run_dir: str, output_dir: str = "data") -> Dict[str, int]:
+    """
+    Combine the outputs of finished shards into single CSV files.
+
+    A restaurant listed under a city is taken from the first shard that
+    produced it; its menu rows from any later shard are dropped. Rows are
+    streamed, and only (restaurant id, city) keys are held in memory. The
+    shards' price sketches are merged city by city the same way, and their
+    dead-letter files are concatenated, so --redrive on output_dir retries
+    every fetch the shards gave up on.
+    """
+    queue = ShardQueue(run_dir)
+    shard_ids = queue.done_shards()
+    pending = {status: count for status, count in queue.status().items() if status != 'done'}
+    if pending:
+        logger.warning(f"Merging {len(shard_ids)} finished shards; not finished: {pending}")
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    outputs = {
+        'restaurants': ("restaurants.csv", RESTAURANT_FIELDS, ('id', 'city_slug')),
+        'menu_items': ("menu_items.csv", MENU_ITEM_FIELDS, ('restaurant_id', 'city')),
+        'restaurants_with_menu': ("restaurants_with_menu.csv", COMBINED_FIELDS, ('id', 'city')),
+    }
+    written = {}
+    for table, (filename, fields, key_fields) in outputs.items():
+        seen = set()
+        rows = 0
+        with open(Path(output_dir) / filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for shard_id in shard_ids:
+                shard_keys = set()
+                for row in _read_rows(queue.shard_dir(shard_id) / "output" / filename):
+                    key = tuple(row.get(field) for field in key_fields)
+                    if key in seen:
+                        continue
+                    shard_keys.add(key)
+                    writer.writerow(row)
+                    rows += 1
+                # Keys only dedupe across shards, so rows repeated within one shard are kept as scraped
+                seen |= shard_keys
+        written[table] = rows
+        logger.info(f"Merged {rows} rows into {Path(output_dir) / filename}")
+
+    # Like the rows, each city's prices come from the first shard that has them
+    sketch = PriceSketch()
+    for shard_id in shard_ids:
+        sketch_path = queue.shard_dir(shard_id) / "output" / PRICE_SKETCH_FILE
+        if sketch_path.exists():
+            sketch.merge(PriceSketch.load(sketch_path), skip_known_cities=True)
+    sketch.save(str(Path(output_dir) / PRICE_SKETCH_FILE))
+
+    dead_letter_path = Path(output_dir) / DEAD_LETTER_FILE
+    entries = []
+    for shard_id in shard_ids:
+        shard_dead_letter = queue.shard_dir(shard_id) / "output" / DEAD_LETTER_FILE
+        if shard_dead_letter.exists():
+            with open(shard_dead_letter, encoding='utf-8') as f:
+                entries.extend(line.rstrip("\n") + "\n" for line in f if line.strip())
+    if entries:
+        with open(dead_letter_path, 'w', encoding='utf-8') as f:
+            f.writelines(entries)
+        logger.warning(f"{len(entries)} fetches failed in the shards, written to {dead_letter_path}")
+    elif dead_letter_path.exists():
+        dead_letter_path.unlink()
+    written['dead_letter'] = len(entries)
+
+    queue.close()
+    return written
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description="Sharded Wolt scraping across processes and machines")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    plan = subparsers.add_parser('plan', help="Split the city list into shards")
+    plan.add_argument('run_dir')
+    plan.add_argument('--cities-file', default="examples/cities.json")
+    plan.add_argument('--countries', nargs='*', default=None,
+                      help="Alpha-2 or alpha-3 country codes (default: every country)")
+    plan.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE,
+                      help=f"Cities per shard (default: {DEFAULT_SHARD_SIZE})")
+
+    work = subparsers.add_parser('work', help="Claim and scrape shards until none are left")
+    work.add_argument('run_dir')
+    work.add_argument('--processes', type=int, default=1, help="Worker processes to start (default: 1)")
+    work.add_argument('--engine', choices=ENGINES, default='async')
+    work.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    work.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                      help=f"Starting requests/s per endpoint family, split across --processes; on several "
+                           f"machines give each its share (default: {DEFAULT_RATE})")
+    work.add_argument('--max-rate', type=float, default=MAX_RATE,
+                      help=f"Ceiling of the adaptive rate, split across --processes (default: {MAX_RATE})")
+    work.add_argument('--item-batch-size', type=int, default=ITEM_BATCH_SIZE,
+                      help=f"Item ids per assortment/items request (default: {ITEM_BATCH_SIZE})")
+    work.add_argument('--no-shared-menus', dest='share_menus', action='store_false',
+                      help="Fetch item details for every branch, even when its assortment matches another's")
+    work.add_argument('--sweep', action='store_true',
+                      help="Discover venues by probing a grid of tiles around each city centre")
+    work.add_argument('--cache-dir', default=None)
+    work.add_argument('--base-url', default=BASE_URL)
+    work.add_argument('--lease', type=float, default=DEFAULT_LEASE,
+                      help=f"Seconds before an unresponsive worker's shard is reassigned (default: {DEFAULT_LEASE})")
+
+    merge = subparsers.add_parser('merge', help="Combine finished shard outputs")
+    merge.add_argument('run_dir')
+    merge.add_argument('--output-dir', default="data")
+
+    status = subparsers.add_parser('status', help="Show shard counts by status")
+    status.add_argument('run_dir')
+
+    return parser.parse_args(argv)
+
+
+def main():
+    """Main entry point"""
+    args = parse_args()
+
+    if args.command == 'plan':
+        cities = WoltScraper(cities_file=args.cities_file).load_cities()
+        if args.countries:
+            codes = {code.upper() for code in args.countries}
+            cities = [
+                city for city in cities
+                if city.get('country_code_alpha2', '').upper() in codes or
+                   city.get('country_code_alpha3', '').upper() in codes
+            ]
+        queue = ShardQueue(args.run_dir)
+        shards = queue.plan(cities, shard_size=args.shard_size)
+        logger.info(f"Planned {shards} shards for {len(cities)} cities in {args.run_dir}")
+
+    elif args.command == 'work':
+        options = worker_options({
+            'engine': args.engine, 'concurrency': args.concurrency, 'rate': args.rate, 'max_rate': args.max_rate,
+            'item_batch_size': args.item_batch_size, 'share_menus': args.share_menus, 'sweep': args.sweep,
+            'cache_dir': args.cache_dir, 'base_url': args.base_url,
+        }, args.processes)
+        if args.processes == 1:
+            run_worker(args.run_dir, options, lease=args.lease)
+        else:
+            workers = [
+                multiprocessing.Process(target=run_worker, args=(args.run_dir, options, args.lease))
+                for _ in range(args.processes)
+            ]
+            for process in workers:
+                process.start()
+            for process in workers:
+                process.join()
+
+    elif args.command == 'merge':
+        merge_shards(args.run_dir, args.output_dir)
+
+    elif args.command == 'status':
+        for status, count in sorted(ShardQueue(args.run_dir).status().items()):
+            print(f"{status}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Wolt Price Sketches
+Constant-memory, mergeable summaries of menu item prices: KLL quantile
+sketches, fixed-bin histograms and exact per-city counts and sums
+"""
+
+import os
+import json
+import math
+import random
+from pathlib import Path
+from typing import List, Dict, Iterable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRICE_SKETCH_FILE = "price_sketch.json"
+
+DEFAULT_K = 256  # KLL accuracy parameter: rank error is roughly 1.7 / k
+PRICE_BIN_WIDTH = 0.5  # histogram bin width in currency units
+PRICE_BINS = 200  # bins from 0; prices beyond the last bin are counted as overflow
+
+SKETCH_VERSION = 1
+
+
+class KllSketch:
+    """
+    KLL quantile sketch (Karnin, Lang and Liberty, 2016).
+
+    Values enter the level-0 compactor; when the sketch is full, the lowest
+    compactor over its capacity is sorted and every other value, starting at
+    a random offset, is promoted to the next level with twice the weight.
+    Capacities shrink by 2/3 per level below the top, so the sketch holds
+    O(k) values however many are added, and two sketches merge by
+    concatenating levels and compacting again. Until the first compaction
+    quantiles are exact.
+    """
+
+    def __init__(self, k: int = DEFAULT_K, seed: Optional[int] = 0):
+        self.k = k
+        self.random = random.Random(seed)
+        self.compactors: List[List[float]] = [[]]
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.size = 0
+        self.max_size = self._capacity(0)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _grow(self):
+        self.compactors.append([])
+        self.max_size = sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def update(self, value: float):
+        self.compactors[0].append(value)
+        self.count += 1
+        self.size += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if self.size >= self.max_size:
+            self._compress()
+
+    def _compress(self):
+        for level in range(len(self.compactors)):
+            items = self.compactors[level]
+            if len(items) < self._capacity(level):
+                continue
+            if level + 1 == len(self.compactors):
+                self._grow()
+            items.sort()
+            # An odd value out stays behind at this level
+            keep = [items.pop()] if len(items) % 2 else []
+            self.compactors[level + 1].extend(items[self.random.random() < 0.5::2])
+            self.compactors[level] = keep
+            self.size = sum(len(compactor) for compactor in self.compactors)
+            if self.size < self.max_size:
+                break
+
+    def merge(self, other: 'KllSketch'):
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.size = sum(len(compactor) for compactor in self.compactors)
+        while self.size >= self.max_size:
+            self._compress()
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The value at rank q * count, or None for an empty sketch"""
+        if not self.count:
+            return None
+        weighted = sorted((value, 1 << level) for level, items in enumerate(self.compactors) for value in items)
+        total = sum(weight for _, weight in weighted)
+        rank = q * total
+        seen = 0
+        for value, weight in weighted:
+            seen += weight
+            if seen >= rank:
+                return value
+        return weighted[-1][0]
+
+    def to_dict(self) -> Dict:
+        return {'k': self.k, 'count': self.count, 'min': self.min if self.count else None,
+                'max': self.max if self.count else None, 'compactors': self.compactors}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'KllSketch':
+        sketch = cls(data['k'])
+        sketch.compactors = [list(items) for items in data['compactors']] or [[]]
+        sketch.count = data['count']
+        if sketch.count:
+            sketch.min, sketch.max = data['min'], data['max']
+        sketch.size = sum(len(items) for items in sketch.compactors)
+        sketch.max_size = sum(sketch._capacity(level) for level in range(len(sketch.compactors)))
+        return sketch
+
+
+class FixedHistogram:
+    """Counts in equal-width bins from start, with underflow and overflow outside them"""
+
+    def __init__(self, start: float = 0.0, width: float = PRICE_BIN_WIDTH, bins: int = PRICE_BINS):
+        self.start = start
+        self.width = width
+        self.counts = [0] * bins
+        self.underflow = 0
+        self.overflow = 0
+
+    @property
+    def edges(self) -> List[float]:
+        return [self.start + i * self.width for i in range(len(self.counts) + 1)]
+
+    def update(self, value: float):
+        index = int((value - self.start) // self.width)
+        if index < 0:
+            self.underflow += 1
+        elif index >= len(self.counts):
+            self.overflow += 1
+        else:
+            self.counts[index] += 1
+
+    def merge(self, other: 'FixedHistogram'):
+        if (other.start, other.width, len(other.counts)) != (self.start, self.width, len(self.counts)):
+            raise ValueError("Cannot merge histograms with different bins")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+
+    def to_dict(self) -> Dict:
+        return {'start': self.start, 'width': self.width, 'counts': self.counts,
+                'underflow': self.underflow, 'overflow': self.overflow}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'FixedHistogram':
+        histogram = cls(data['start'], data['width'], len(data['counts']))
+        histogram.counts = list(data['counts'])
+        histogram.underflow = data['underflow']
+        histogram.overflow = data['overflow']
+        return histogram
+
+
+class PriceStats:
+    """Exact count and sum plus a quantile sketch and histogram of one group's prices"""
+
+    def __init__(self, k: int = DEFAULT_K):
+        self.count = 0
+        self.sum = 0.0
+        self.quantiles = KllSketch(k)
+        self.histogram = FixedHistogram()
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def update(self, price: float):
+        self.count += 1
+        self.sum += price
+        self.quantiles.update(price)
+        self.histogram.update(price)
+
+    def merge(self, other: 'PriceStats'):
+        self.count += other.count
+        self.sum += other.sum
+        self.quantiles.merge(other.quantiles)
+        self.histogram.merge(other.histogram)
+
+    def to_dict(self) -> Dict:
+        return {'count': self.count, 'sum': self.sum, 'quantiles': self.quantiles.to_dict(),
+                'histogram': self.histogram.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'PriceStats':
+        stats = cls()
+        stats.count = data['count']
+        stats.sum = data['sum']
+        stats.quantiles = KllSketch.from_dict(data['quantiles'])
+        stats.histogram = FixedHistogram.from_dict(data['histogram'])
+        return stats
+
+
+class PriceSketch:
+    """
+    Paid menu item prices (item_price > 0, in currency units rather than
+    cents) summarized per city.
+
+    The scraper's sinks update it as menus are written and it is saved as
+    PRICE_SKETCH_FILE next to the CSV files. Sketches of different cities,
+    runs or shards merge without the underlying rows, and total() merges the
+    cities for market-wide figures. Means and counts are exact; quantiles
+    are approximate once a city has more than about k prices.
+    """
+
+    def __init__(self, k: int = DEFAULT_K):
+        self.k = k
+        self.cities: Dict[str, PriceStats] = {}
+
+    def add(self, city, item_price):
+        """Add one item's price in cents; missing and non-positive prices are skipped"""
+        try:
+            price = float(item_price)
+        except (TypeError, ValueError):
+            return
+        if not price > 0:
+            return
+        stats = self.cities.get(city)
+        if stats is None:
+            stats = self.cities[city] = PriceStats(self.k)
+        stats.update(price / 100)
+
+    def add_items(self, items: Iterable):
+        """Add menu item records"""
+        for item in items:
+            self.add(item.owner.city, item.item_price)
+
+    def add_prices(self, cities: Iterable, item_prices: Iterable):
+        """Add parallel columns of cities and prices in cents, e.g. from a menu_items chunk"""
+        for city, item_price in zip(cities, item_prices):
+            self.add(city, item_price)
+
+    def merge(self, other: 'PriceSketch', skip_known_cities: bool = False):
+        """Fold in another sketch; with skip_known_cities, cities already present are left as they are"""
+        for city, stats in other.cities.items():
+            mine = self.cities.get(city)
+            if mine is None:
+                self.cities[city] = PriceStats.from_dict(stats.to_dict())
+            elif not skip_known_cities:
+                mine.merge(stats)
+
+    def total(self) -> PriceStats:
+        total = PriceStats(self.k)
+        for city in sorted(self.cities, key=str):
+            total.merge(self.cities[city])
+        return total
+
+    def to_dict(self) -> Dict:
+        return {'version': SKETCH_VERSION, 'k': self.k,
+                'cities': [{'city': city, **stats.to_dict()} for city, stats in self.cities.items()]}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'PriceSketch':
+        if data.get('version') != SKETCH_VERSION:
+            raise ValueError(f"Unsupported price sketch version {data.get('version')}")
+        sketch = cls(data['k'])
+        for entry in data['cities']:
+            sketch.cities[entry['city']] = PriceStats.from_dict(entry)
+        return sketch
+
+    def save(self, path: str):
+        """Write the sketch as JSON via a temporary file"""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'PriceSketch':
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Wolt Menu Snapshots
+Per-venue record of the last scraped menu, for fetching only what changed since
+"""
+
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import List, Dict, Optional, NamedTuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "snapshot.sqlite"  # in the run's output directory unless a path is given
+DEFAULT_SNAPSHOT = f"data/{SNAPSHOT_FILE}"
+DEFAULT_MAX_AGE_DAYS = 7.0  # items older than this are fetched again even when nothing else changed
+
+# Venue fields that describe the menu's owner; ratings, delivery estimates and
+# availability change all day and say nothing about the items
+VENUE_FINGERPRINT_FIELDS = (
+    'id', 'name', 'slug', 'address', 'franchise', 'product_line', 'short_description',
+    'tags', 'currency', 'price_range',
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS menus (
+    venue_key TEXT PRIMARY KEY,
+    venue_fingerprint TEXT NOT NULL,
+    layout TEXT NOT NULL,
+    items BLOB NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class MenuSnapshot(NamedTuple):
+    """A venue's menu as of the last run: output rows and when each item was fetched"""
+    venue_fingerprint: str
+    layout: str
+    rows: List[Dict]
+    fetched_at: List[float]
+
+
+def venue_key(restaurant: Dict) -> str:
+    """Identify a venue across runs"""
+    return restaurant.get('id') or f"{restaurant.get('city_slug', '')}/{restaurant.get('slug')}"
+
+
+def venue_fingerprint(restaurant: Dict) -> str:
+    """Hash of the venue fields in VENUE_FINGERPRINT_FIELDS"""
+    fields = {field: restaurant.get(field) for field in VENUE_FINGERPRINT_FIELDS}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class SnapshotStore:
+    """
+    The last scraped menu of every venue, kept across runs.
+
+    Each menu is stored with the fingerprint of its venue metadata, the
+    fingerprint of its assortment layout and the fetch time of every item, so
+    a delta run can tell which item ids are new or possibly changed. Menus are
+    replaced one venue at a time as a run finishes them; venues that drop off
+    keep their last menu.
+    """
+
+    def __init__(self, path: str = DEFAULT_SNAPSHOT):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM menus").fetchone()[0]
+
+    def previous(self, restaurant: Dict) -> Optional[MenuSnapshot]:
+        """The venue's last recorded menu, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT venue_fingerprint, layout, items FROM menus WHERE venue_key = ?", (venue_key(restaurant),)
+            ).fetchone()
+        if row is None:
+            return None
+        items = json.loads(zlib.decompress(row[2]))
+        return MenuSnapshot(row[0], row[1], items['rows'], items['fetched_at'])
+
+    def record(self, restaurant: Dict, layout: str, rows: List[Dict], fetched_at: List[float]):
+        items = zlib.compress(json.dumps({'rows': rows, 'fetched_at': fetched_at},
+                                         ensure_ascii=False).encode('utf-8'))
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO menus (venue_key, venue_fingerprint, layout, items, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (venue_key(restaurant), venue_fingerprint(restaurant), layout, items, time.time())
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
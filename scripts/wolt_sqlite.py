@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Wolt SQLite Store
+Indexed, transactional storage of cities, venues and menu items, as an
+alternative to the CSV outputs
+"""
+
+import time
+import uuid
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Dict, Iterable, Iterator, Optional
+import logging
+
+from wolt_output import RESTAURANT_FIELDS, MENU_ITEM_FIELDS
+from wolt_checkpoint import city_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATABASE = "data/wolt.sqlite"
+DEFAULT_BATCH_ROWS = 5000  # rows per executemany call within a write transaction
+
+# Output table -> database table
+SQL_TABLES = {
+    'restaurants': 'venues',
+    'menu_items': 'menu_items',
+}
+
+# Column affinities by name; anything not listed is TEXT
+COLUMN_TYPES = {
+    # venues
+    'online': 'INTEGER',
+    'delivers': 'INTEGER',
+    'price_range': 'INTEGER',
+    'delivery_price_int': 'INTEGER',
+    'estimate_min': 'INTEGER',
+    'estimate_max': 'INTEGER',
+    'rating_score': 'REAL',
+    'rating_count': 'INTEGER',
+    'location_lat': 'REAL',
+    'location_lon': 'REAL',
+    # menu items
+    'item_price': 'INTEGER',
+    'item_has_options': 'INTEGER',
+    'item_vat_percentage': 'REAL',
+}
+
+CITY_FIELDS = ['id', 'slug', 'name', 'country', 'timezone', 'location_lat', 'location_lon']
+
+
+def _columns_sql(fields: List[str], primary_key: Optional[str] = None) -> str:
+    return ",\n    ".join(
+        f"{field} {COLUMN_TYPES.get(field, 'TEXT')}{' PRIMARY KEY' if field == primary_key else ''}"
+        for field in fields
+    )
+
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS cities (
+    {_columns_sql(CITY_FIELDS, primary_key='id')}
+);
+CREATE TABLE IF NOT EXISTS venues (
+    {_columns_sql(RESTAURANT_FIELDS)},
+    PRIMARY KEY (id, city_slug)
+);
+CREATE TABLE IF NOT EXISTS menu_items (
+    {_columns_sql(MENU_ITEM_FIELDS)}
+);
+CREATE TABLE IF NOT EXISTS versions (
+    name TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cities_slug ON cities (slug);
+CREATE INDEX IF NOT EXISTS venues_slug ON venues (slug);
+CREATE INDEX IF NOT EXISTS venues_city ON venues (city);
+CREATE INDEX IF NOT EXISTS venues_city_slug ON venues (city_slug);
+CREATE INDEX IF NOT EXISTS menu_items_restaurant ON menu_items (restaurant_id, city);
+CREATE INDEX IF NOT EXISTS menu_items_city ON menu_items (city);
+"""
+
+
+def _values(row: Dict, fields: List[str]) -> tuple:
+    """A row's values in field order; empty strings in typed columns are stored as NULL"""
+    values = []
+    for field in fields:
+        value = row.get(field)
+        values.append(None if value == '' and field in COLUMN_TYPES else value)
+    return tuple(values)
+
+
+def city_row(city: Dict) -> Dict:
+    """A cities.json entry as a cities row"""
+    coordinates = (city.get('location') or {}).get('coordinates') or []
+    return {
+        'id': city_key(city),
+        'slug': city.get('slug'),
+        'name': city.get('name'),
+        'country': city.get('country_code_alpha3', city.get('country_code_alpha2')),
+        'timezone': city.get('timezone'),
+        'location_lat': coordinates[1] if len(coordinates) > 1 else None,
+        'location_lon': coordinates[0] if coordinates else None,
+    }
+
+
+def _batches(rows: Iterable[tuple], batch_rows: int) -> Iterator[List[tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class WoltDatabase:
+    """
+    Cities, venues and menu items in one SQLite file.
+
+    A venue listed in several cities has a row in each, so venues are keyed
+    on (id, city_slug) as merge_shards keys them, and menus on
+    (restaurant_id, city). Each write is a single transaction: the venues
+    written replace earlier rows with the same key, and the menu of every
+    restaurant written, as a venue or through its items, replaces its
+    earlier menu in that city. Venues and menus of other cities or earlier
+    runs stay. Rows are inserted with executemany
+    in batches of batch_rows. Every write also records a fresh version for
+    the tables it touched, so readers can tell whether cached results are
+    still current without hashing the file.
+    """
+
+    def __init__(self, path: str = DEFAULT_DATABASE, readonly: bool = False,
+                 batch_rows: int = DEFAULT_BATCH_ROWS):
+        self.path = path
+        self.batch_rows = batch_rows
+        self.lock = threading.Lock()
+        if readonly:
+            if not Path(path).exists():
+                raise FileNotFoundError(f"No database at {path}")
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+
+    def _insert(self, table: str, fields: List[str], rows: Iterable[Dict], replace: bool = False) -> int:
+        sql = (f"INSERT {'OR REPLACE ' if replace else ''}INTO {table} ({', '.join(fields)}) "
+               f"VALUES ({', '.join('?' * len(fields))})")
+        written = 0
+        for batch in _batches((_values(row, fields) for row in rows), self.batch_rows):
+            self.conn.executemany(sql, batch)
+            written += len(batch)
+        return written
+
+    def _bump(self, tables: Iterable[str]):
+        now = time.time()
+        self.conn.executemany("INSERT OR REPLACE INTO versions (name, version, updated_at) VALUES (?, ?, ?)",
+                              [(table, uuid.uuid4().hex, now) for table in tables])
+
+    def write(self, cities: List[Dict], flat_restaurants: List[Dict], menu_items: List):
+        """Store scraped cities (cities.json entries), flattened venues and menu item records in one transaction"""
+        menu_keys = ({(r.get('id'), r.get('city')) for r in flat_restaurants} |
+                     {(item.restaurant_id, item.owner.city) for item in menu_items})
+        menu_keys = {key for key in menu_keys if key[0] is not None}
+        with self.lock, self.conn:
+            self._insert('cities', CITY_FIELDS, (city_row(city) for city in cities), replace=True)
+            venues = self._insert('venues', RESTAURANT_FIELDS, flat_restaurants, replace=True)
+            for batch in _batches(menu_keys, self.batch_rows):
+                self.conn.executemany("DELETE FROM menu_items WHERE restaurant_id = ? AND city IS ?", batch)
+            items = self._insert('menu_items', MENU_ITEM_FIELDS, (item.as_row() for item in menu_items))
+            self._bump(('cities', 'venues', 'menu_items'))
+        logger.info(f"Stored {venues} venues and {items} menu items in {self.path}")
+
+    def version(self, table: str) -> str:
+        """Identifier of the table's last write, or 'empty' for a table never written"""
+        row = self.query("SELECT version FROM versions WHERE name = ?", (table,))
+        return row[0][0] if row else 'empty'
+
+    def query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def counts(self) -> Dict[str, int]:
+        return {table: self.query(f"SELECT COUNT(*) FROM {table}")[0][0]
+                for table in ('cities', 'venues', 'menu_items')}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
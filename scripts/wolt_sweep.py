@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Wolt Geographic Sweep
+Grid tiling around a city centre and a venue index for deduplicating probes
+"""
+
+import math
+from typing import List, Dict, Tuple
+
+KM_PER_DEGREE_LAT = 111.32
+
+DEFAULT_TILE_SPACING_KM = 2.0
+DEFAULT_MAX_RINGS = 8
+DEFAULT_MIN_NEW_VENUES = 1  # a ring adding fewer new venues than this ends the sweep
+
+
+def ring_tiles(lat: float, lon: float, ring: int, spacing_km: float) -> List[Tuple[float, float]]:
+    """
+    Probe points on the square ring `ring` tiles out from (lat, lon).
+
+    Ring 0 is the centre itself; ring r has 8r points, walked clockwise from
+    the north-west corner so the order is stable between runs.
+    """
+    if ring == 0:
+        return [(lat, lon)]
+
+    dlat = spacing_km / KM_PER_DEGREE_LAT
+    dlon = spacing_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+
+    steps = []
+    steps += [(ring, dx) for dx in range(-ring, ring)]  # north edge, west to east
+    steps += [(dy, ring) for dy in range(ring, -ring, -1)]  # east edge, north to south
+    steps += [(-ring, dx) for dx in range(ring, -ring, -1)]  # south edge, east to west
+    steps += [(dy, -ring) for dy in range(-ring, ring)]  # west edge, south to north
+    return [(lat + dy * dlat, lon + dx * dlon) for dy, dx in steps]
+
+
+class VenueIndex:
+    """Venues keyed by id, kept in first-seen order"""
+
+    def __init__(self):
+        self.venues: Dict[str, Dict] = {}
+
+    def add(self, venues: List[Dict]) -> int:
+        """Add venues not seen before; returns how many were new"""
+        new = 0
+        for venue in venues:
+            venue_id = venue.get('id')
+            if venue_id not in self.venues:
+                self.venues[venue_id] = venue
+                new += 1
+        return new
+
+    def __len__(self):
+        return len(self.venues)
+
+    def values(self) -> List[Dict]:
+        return list(self.venues.values())
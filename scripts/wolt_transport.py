@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Wolt HTTP Transport
+Pooled keep-alive HTTP session shared by all scraper fetchers
+"""
+
+import json
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Optional, Callable, Tuple
+import logging
+
+from wolt_cache import ResponseCache, cache_key
+from wolt_json import loads
+from wolt_metrics import Metrics
+from wolt_archive import ResponseArchive
+from wolt_ratelimit import RateLimiter, parse_retry_after
+from wolt_retry import status_error_class
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30  # seconds
+DEFAULT_POOL_SIZE = 10  # connections kept alive per host
+MAX_THROTTLE_RETRIES = 3  # default re-sends after a 429/5xx before giving up
+
+# Responses that mean "slow down" rather than "this request is wrong"
+THROTTLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ArchiveMiss(LookupError):
+    """A replayed request has no response in the archive"""
+
+
+def encode_payload(payload: Any) -> str:
+    """Serialize a POST payload; the text is part of the cache and archive keys"""
+    return json.dumps(payload, separators=(',', ':'))
+
+
+class WoltTransport:
+    """
+    A single requests.Session with a sized connection pool.
+
+    Headers, compression and timeouts are configured once here so the fetchers
+    only pass a URL and parameters. Connections are kept alive between calls,
+    so each request after the first skips the TCP/TLS handshake. Every request
+    first takes a token from its endpoint family's bucket in the rate limiter.
+    With a ResponseCache attached, fresh hits are served from disk without a
+    request and stale entries are revalidated with ETag/Last-Modified.
+    Bodies are decoded with orjson when it is installed, and an optional
+    extract function reduces each document to the fields the caller needs.
+    Each call is timed and counted in the Metrics registry by endpoint family:
+    overall call time, rate limiter waits, request latency, decode time,
+    status codes, bytes, cache outcomes, retries and errors by class. With a
+    ResponseArchive attached, every raw body the scraper consumes (fetched or
+    cached) is recorded for offline replay. A 429/5xx always slows the rate
+    limiter down, and is re-sent up to throttle_retries times; callers with
+    a retry queue of their own pass 0 so they are the only retry layer.
+    """
+
+    def __init__(self, headers: Dict[str, str], pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT,
+                 rate_limiter: Optional[RateLimiter] = None, cache: Optional[ResponseCache] = None,
+                 metrics: Optional[Metrics] = None, archive: Optional[ResponseArchive] = None,
+                 throttle_retries: int = MAX_THROTTLE_RETRIES):
+        self.timeout = timeout
+        self.throttle_retries = throttle_retries
+        self.pool_size = pool_size
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.cache = cache
+        self.metrics = metrics or Metrics()
+        self.archive = archive
+
+        # Precomputed header sets, built once instead of per request
+        self.headers = dict(headers)
+        self.headers.setdefault('accept-encoding', 'gzip, deflate')
+        self.headers['connection'] = 'keep-alive'
+        self.json_headers = {**self.headers, 'content-type': 'application/json'}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _send(self, family: str, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a rate-limited request, backing off and re-sending on 429/5xx"""
+        metrics = self.metrics
+        for attempt in range(self.throttle_retries + 1):
+            with metrics.timer('wolt_ratelimit_wait_seconds', endpoint=family):
+                self.rate_limiter.acquire(family)
+            start = time.perf_counter()
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            metrics.observe('wolt_request_seconds', time.perf_counter() - start, endpoint=family)
+            metrics.inc('wolt_requests_total', endpoint=family, status=response.status_code)
+            metrics.inc('wolt_response_bytes_total', len(response.content), endpoint=family)
+            wire_bytes = getattr(response.raw, 'tell', None)
+            if wire_bytes is not None:
+                metrics.inc('wolt_wire_bytes_total', wire_bytes(), endpoint=family)
+            if response.status_code not in THROTTLE_STATUSES:
+                break
+            retry_after = parse_retry_after(response.headers.get('retry-after'))
+            self.rate_limiter.on_throttle(family, retry_after)
+            if attempt < self.throttle_retries:
+                metrics.inc('wolt_retries_total', layer='transport', outcome='resent', endpoint=family,
+                            error_class=status_error_class(response.status_code))
+                response.close()
+
+        response.raise_for_status()
+        self.rate_limiter.on_success(family)
+        return response
+
+    def _request_json(self, family: str, method: str, url: str, headers: Dict[str, str],
+                      params: Optional[Dict[str, Any]] = None, body: Optional[str] = None,
+                      extract: Optional[Callable[[Any], Any]] = None) -> Any:
+        """Fetch and decode a JSON response, going through the cache when one is configured"""
+        try:
+            with self.metrics.timer('wolt_endpoint_seconds', endpoint=family):
+                data, content = self._fetch_json(family, method, url, headers, params=params, body=body)
+                if self.archive is not None:
+                    self.archive.record(family, method, url, params, body, content)
+                return extract(data) if extract is not None else data
+        except Exception as e:
+            self.metrics.inc('wolt_errors_total', endpoint=family, error=type(e).__name__)
+            raise
+
+    def _decode(self, family: str, body: bytes) -> Any:
+        with self.metrics.timer('wolt_decode_seconds', endpoint=family):
+            return loads(body)
+
+    def _fetch_json(self, family: str, method: str, url: str, headers: Dict[str, str],
+                    params: Optional[Dict[str, Any]] = None, body: Optional[str] = None) -> Tuple[Any, bytes]:
+        """Return the decoded document and the raw body it came from"""
+        if self.cache is None:
+            content = self._send(family, method, url, params=params, data=body, headers=headers).content
+            return self._decode(family, content), content
+
+        key = cache_key(method, url, params, body)
+        cached = self.cache.get(key, family)
+        if cached is not None and cached.fresh:
+            # Fresh hits never touch the network, so they skip the rate limiter too
+            self.metrics.inc('wolt_cache_total', endpoint=family, result='hit')
+            return self._decode(family, cached.body), cached.body
+
+        if cached is not None:
+            headers = dict(headers)
+            if cached.etag:
+                headers['if-none-match'] = cached.etag
+            if cached.last_modified:
+                headers['if-modified-since'] = cached.last_modified
+
+        response = self._send(family, method, url, params=params, data=body, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            self.cache.touch(key)
+            self.metrics.inc('wolt_cache_total', endpoint=family, result='revalidated')
+            return self._decode(family, cached.body), cached.body
+
+        self.metrics.inc('wolt_cache_total', endpoint=family, result='miss' if cached is None else 'changed')
+        data = self._decode(family, response.content)
+        self.cache.put(key, family, url, response.content,
+                       etag=response.headers.get('etag'), last_modified=response.headers.get('last-modified'))
+        return data, response.content
+
+    def get_json(self, url: str, params: Optional[Dict[str, Any]] = None, family: str = 'default',
+                 extract: Optional[Callable[[Any], Any]] = None) -> Any:
+        """GET a URL through the shared pool and return the decoded JSON body, or extract(body)"""
+        return self._request_json(family, 'GET', url, self.headers, params=params, extract=extract)
+
+    def post_json(self, url: str, payload: Any, family: str = 'default',
+                  extract: Optional[Callable[[Any], Any]] = None) -> Any:
+        """POST a JSON body through the shared pool and return the decoded JSON body, or extract(body)"""
+        return self._request_json(family, 'POST', url, self.json_headers, body=encode_payload(payload), extract=extract)
+
+    def close(self):
+        """Close all pooled connections and the response cache"""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.archive is not None:
+            self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ArchiveTransport:
+    """
+    Drop-in replacement for WoltTransport that answers every request from a
+    ResponseArchive, with no network access. Each request gets the newest
+    archived response fetched no later than as_of. Requests must match the
+    recorded ones exactly, so replays use the recording's base URL, item
+    batch size and sweep settings.
+    """
+
+    def __init__(self, archive: ResponseArchive, as_of: Optional[float] = None, metrics: Optional[Metrics] = None):
+        self.archive = archive
+        self.as_of = as_of
+        self.metrics = metrics or Metrics()
+
+    def _request_json(self, family: str, method: str, url: str, params: Optional[Dict[str, Any]] = None,
+                      body: Optional[str] = None, extract: Optional[Callable[[Any], Any]] = None) -> Any:
+        content = self.archive.lookup(method, url, params, body, as_of=self.as_of)
+        if content is None and body is not None:
+            # A branch that shared another's menu when recorded; its identical batch was archived under that URL
+            content = self.archive.lookup_payload(method, body, as_of=self.as_of)
+        if content is None:
+            self.metrics.inc('wolt_errors_total', endpoint=family, error=ArchiveMiss.__name__)
+            raise ArchiveMiss(f"No archived response for {method} {url}")
+        with self.metrics.timer('wolt_decode_seconds', endpoint=family):
+            data = loads(content)
+        return extract(data) if extract is not None else data
+
+    def get_json(self, url: str, params: Optional[Dict[str, Any]] = None, family: str = 'default',
+                 extract: Optional[Callable[[Any], Any]] = None) -> Any:
+        return self._request_json(family, 'GET', url, params=params, extract=extract)
+
+    def post_json(self, url: str, payload: Any, family: str = 'default',
+                  extract: Optional[Callable[[Any], Any]] = None) -> Any:
+        return self._request_json(family, 'POST', url, body=encode_payload(payload), extract=extract)
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
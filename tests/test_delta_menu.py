@@ -0,0 +1,72 @@
+"""Delta scraping against the menu snapshot"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from scrape_wolt_restaurants import WoltScraper  # noqa: E402
+
+RESTAURANT = {'id': 'venue-1', 'slug': 'venue-1', 'name': 'Venue', 'city': 'Baku', 'city_slug': 'baku',
+              'currency': 'AZN', 'online': True, 'delivers': True}
+
+
+class StubTransport:
+    """Answers the assortment and item details calls from fixed item dicts, recording the ids requested"""
+
+    def __init__(self, items):
+        self.items = {item['id']: item for item in items}
+        self.requested = []
+
+    def get_json(self, url, params=None, family='default', extract=None):
+        data = {
+            'categories': [{'id': 'mains', 'item_ids': list(self.items)}],
+            'items': [{'id': item['id'], 'checksum': item['checksum'], 'price': item['price']}
+                      for item in self.items.values()],
+        }
+        return extract(data) if extract is not None else data
+
+    def post_json(self, url, payload, family='default', extract=None):
+        self.requested.extend(payload['item_ids'])
+        data = {'items': [self.items[item_id] for item_id in payload['item_ids']]}
+        return extract(data) if extract is not None else data
+
+    def close(self):
+        pass
+
+
+def item(item_id, price):
+    return {'id': item_id, 'name': item_id.title(), 'price': price, 'checksum': f"{item_id}-{price}"}
+
+
+def scrape(snapshot_path, items):
+    """One delta run over RESTAURANT; returns the menu prices and the item ids that were fetched"""
+    scraper = WoltScraper(snapshot_path=str(snapshot_path), delta=True, share_menus=False,
+                          output_dir=str(snapshot_path.parent))
+    scraper.transport.close()
+    scraper.transport = transport = StubTransport(items)
+    try:
+        menu = scraper.fetch_menu_items_for_restaurant(dict(RESTAURANT))
+    finally:
+        scraper.close()
+    return {menu_item.item_id: menu_item.item_price for menu_item in menu}, transport.requested
+
+
+def test_unchanged_menu_is_carried_forward(tmp_path):
+    snapshot = tmp_path / "snapshot.sqlite"
+    scrape(snapshot, [item('soup', 500), item('bread', 100)])
+
+    prices, requested = scrape(snapshot, [item('soup', 500), item('bread', 100)])
+
+    assert prices == {'soup': 500, 'bread': 100}
+    assert requested == []
+
+
+def test_price_change_with_the_same_item_ids_is_fetched(tmp_path):
+    snapshot = tmp_path / "snapshot.sqlite"
+    scrape(snapshot, [item('soup', 500), item('bread', 100)])
+
+    prices, requested = scrape(snapshot, [item('soup', 650), item('bread', 100)])
+
+    assert prices == {'soup': 650, 'bread': 100}
+    assert sorted(requested) == ['bread', 'soup']